@@ -0,0 +1,60 @@
+# keeps the daily_activity rollup in step with completed_routines. there is one row per (user, date, workout)
+# holding how many times the routine was completed that day, so the dashboard's windowed figures (days worked
+# out, routines done, favorite routine, the last-10 pie chart) read at most one row per routine per day of the
+# window instead of the raw log. logging a workout bumps its row; deleting a routine drops its rows and renaming
+# one rebuilds the user's rollup, since the new name may already have rows on the same days. the rollup is
+# written by whoever changes completed_routines (a view's session, an import batch's connection), in the same
+# transaction, so the two are never out of step.
+from sqlalchemy import text
+
+
+RECORD_SESSIONS_SQL = text('''
+INSERT INTO daily_activity (user_id, date, workout_name_id, sessions)
+VALUES (:user_id, :date, :workout_name_id, :sessions)
+ON CONFLICT (user_id, date, workout_name_id) DO UPDATE SET sessions = daily_activity.sessions + excluded.sessions
+''')
+
+DELETE_ROUTINE_ACTIVITY_SQL = text('DELETE FROM daily_activity '
+                                   'WHERE user_id = :user_id AND workout_name_id = :workout_name_id')
+
+_ROLLUP_SQL = '''
+INSERT INTO daily_activity (user_id, date, workout_name_id, sessions)
+SELECT user_id, date, workout_name_id, count(*) FROM completed_routines
+WHERE workout_name_id IS NOT NULL {conditions}
+GROUP BY user_id, date, workout_name_id
+'''
+
+DELETE_USER_ACTIVITY_SQL = text('DELETE FROM daily_activity WHERE user_id = :user_id')
+REBUILD_USER_ACTIVITY_SQL = text(_ROLLUP_SQL.format(conditions='AND user_id = :user_id'))
+
+DELETE_ALL_ACTIVITY_SQL = text('DELETE FROM daily_activity')
+REBUILD_ALL_ACTIVITY_SQL = text(_ROLLUP_SQL.format(conditions=''))
+
+
+def record_completed_routines(connection, rows):
+    # called with the completed_routines rows just inserted ({'user_id', 'date', 'workout_name_id'} dicts)
+    sessions = {}
+    for row in rows:
+        if row['workout_name_id'] is None:
+            continue
+        key = (row['user_id'], row['date'], row['workout_name_id'])
+        sessions[key] = sessions.get(key, 0) + 1
+    if sessions:
+        connection.execute(RECORD_SESSIONS_SQL, [
+            {'user_id': user_id, 'date': session_date, 'workout_name_id': workout_name_id, 'sessions': count}
+            for (user_id, session_date, workout_name_id), count in sessions.items()
+        ])
+
+
+def forget_routine_activity(connection, user_id, workout_name_id):
+    connection.execute(DELETE_ROUTINE_ACTIVITY_SQL, {'user_id': user_id, 'workout_name_id': workout_name_id})
+
+
+def rebuild_daily_activity(connection, user_id):
+    connection.execute(DELETE_USER_ACTIVITY_SQL, {'user_id': user_id})
+    connection.execute(REBUILD_USER_ACTIVITY_SQL, {'user_id': user_id})
+
+
+def rebuild_all_daily_activity(connection):
+    connection.execute(DELETE_ALL_ACTIVITY_SQL)
+    connection.execute(REBUILD_ALL_ACTIVITY_SQL)
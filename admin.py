@@ -0,0 +1,17 @@
+# the operator-only pages (/pool-stats, /job-stats): pool sizes, queue depths and timings of the whole process, not
+# something every user should see. they answer 404 unless the logged in user's email is in ADMIN_EMAILS
+from functools import wraps
+
+from flask import abort, current_app
+from flask_login import current_user, login_required
+
+
+def admin_required(view):
+    # in place of @login_required
+    @login_required
+    @wraps(view)
+    def admin_view(*args, **kwargs):
+        if current_user.email.lower() not in current_app.config['ADMIN_EMAILS']:
+            abort(404)
+        return view(*args, **kwargs)
+    return admin_view
@@ -0,0 +1,153 @@
+# training analytics over the user's whole logged history, for /api/analytics and the routine dashboard's records
+# table:
+#   estimated 1rm  -> per set, epley w * (1 + r / 30) or brzycki w * 36 / (37 - r). a single is its own weight
+#   per session    -> the best estimate and the tonnage (sets x reps x weight) of each exercise on each day
+#   rolling        -> the mean best estimate over the last ANALYTICS_ROLLING_SESSIONS sessions of the exercise
+#   trend          -> least squares slope of the session bests against the date, in weight per week
+# the sets are loaded as numpy columns and every exercise is worked out at once with grouped array operations
+# (sort, reduceat, cumsum, bincount), so a user with 50k+ logged sets costs one query and a few ms of numpy
+# rather than a python loop per set. a missing sets count counts as one set, a missing reps count as a single.
+import numpy as np
+
+from names import EXERCISE_NAMES, id_names, name_id
+from queries import EXERCISE_SETS, USER_SETS, fetch
+
+
+FORMULAS = ('epley', 'brzycki')
+
+
+def load_sets(session, user_id, exercise=None):
+    # -> {'names': exercise names, 'exercise': index into names, 'day': datetime64[D], 'sets', 'reps', 'weight'}
+    # with one entry per logged set, sorted by exercise then day. None when nothing was logged
+    if exercise is None:
+        rows = fetch(session, USER_SETS, user_id=user_id)
+    else:
+        rows = fetch(session, EXERCISE_SETS, user_id=user_id,
+                     exercise_name_id=name_id(session, EXERCISE_NAMES, user_id, exercise))
+    if not rows:
+        return None
+    exercise_column, days, sets, reps, weight = zip(*rows)
+    # grouped on the integer name ids, only the distinct ones are turned into names
+    exercise_ids, codes = np.unique(np.array(exercise_column, dtype='int64'), return_inverse=True)
+    id_to_name = id_names(session, EXERCISE_NAMES, user_id, exercise_ids.tolist())
+    names = [id_to_name[exercise_id] for exercise_id in exercise_ids.tolist()]
+    days = np.array(days, dtype='int64').astype('datetime64[D]')
+    order = np.lexsort((days, codes))
+    return {
+        'names': names,
+        'exercise': codes[order],
+        'day': days[order],
+        # None -> nan
+        'sets': np.array(sets, dtype=float)[order],
+        'reps': np.array(reps, dtype=float)[order],
+        'weight': np.array(weight, dtype=float)[order],
+    }
+
+
+def estimated_1rm(weight, reps, formula='epley'):
+    reps = np.where(np.isnan(reps), 1, reps)
+    if formula == 'epley':
+        estimate = weight * (1 + reps / 30)
+    else:
+        # brzycki is undefined from 37 reps up
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimate = np.where(reps < 37, weight * 36 / (37 - reps), np.nan)
+    return np.where(reps <= 1, weight, estimate)
+
+
+def session_figures(sets, formula='epley', window=5):
+    # -> one entry per (exercise, day): 'exercise', 'day', 'e1rm' (best estimate), 'tonnage', 'rolling'
+    exercise, day = sets['exercise'], sets['day']
+    starts = np.flatnonzero(np.r_[True, (exercise[1:] != exercise[:-1]) | (day[1:] != day[:-1])])
+    estimates = estimated_1rm(sets['weight'], sets['reps'], formula)
+    # a session with no usable estimate (brzycki past 36 reps) stays nan, fmax skips the others
+    best = np.fmax.reduceat(estimates, starts)
+    volume = (np.where(np.isnan(sets['sets']), 1, sets['sets']) * np.where(np.isnan(sets['reps']), 1, sets['reps'])
+              * sets['weight'])
+    tonnage = np.add.reduceat(volume, starts)
+
+    session_exercise = exercise[starts]
+    # rolling mean of the bests over the last `window` sessions of the same exercise, from one running sum
+    index = np.arange(len(starts))
+    new_exercise = np.r_[True, session_exercise[1:] != session_exercise[:-1]]
+    exercise_start = np.maximum.accumulate(np.where(new_exercise, index, 0))
+    window_start = np.maximum(index - window + 1, exercise_start)
+    known = ~np.isnan(best)
+    running = np.r_[0, np.cumsum(np.where(known, best, 0))]
+    counts = np.r_[0, np.cumsum(known)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rolling = (running[index + 1] - running[window_start]) / (counts[index + 1] - counts[window_start])
+    return {'exercise': session_exercise, 'day': day[starts], 'e1rm': best, 'tonnage': tonnage, 'rolling': rolling}
+
+
+def weekly_trend(sessions, exercise_count):
+    # least squares slope of e1rm against days since the exercise's first session, per exercise, from per
+    # exercise sums (bincount). nan where there are fewer than two sessions on different days
+    known = ~np.isnan(sessions['e1rm'])
+    exercise = sessions['exercise'][known]
+    y = sessions['e1rm'][known]
+    days = sessions['day'][known].astype('int64').astype(float)
+    first_day = np.full(exercise_count, np.inf)
+    np.minimum.at(first_day, exercise, days)
+    x = days - first_day[exercise]
+
+    def total(weights=None):
+        return np.bincount(exercise, weights=weights, minlength=exercise_count)
+
+    n, sum_x, sum_y, sum_xy, sum_xx = total(), total(x), total(y), total(x * y), total(x * x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = n * sum_xx - sum_x ** 2
+        slope = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, np.nan)
+    return slope * 7
+
+
+def _number(value, digits=1):
+    # numpy float -> json-friendly float, nan -> None
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def exercise_summaries(session, user_id, formula='epley', window=5):
+    # -> {'Squat': {'sessions', 'last_session', 'best_e1rm', 'latest_e1rm', 'rolling_e1rm', 'trend_per_week',
+    #               'tonnage'}} for every exercise the user has logged a weight for
+    sets = load_sets(session, user_id)
+    if sets is None:
+        return {}
+    sessions = session_figures(sets, formula, window)
+    codes = sessions['exercise']
+    exercise_count = len(sets['names'])
+    trend = weekly_trend(sessions, exercise_count)
+    session_count = np.bincount(codes, minlength=exercise_count)
+    tonnage = np.bincount(codes, weights=sessions['tonnage'], minlength=exercise_count)
+    best = np.full(exercise_count, np.nan)
+    np.fmax.at(best, codes, sessions['e1rm'])
+    # sessions are sorted by exercise then day, so each exercise's last session ends its run
+    last = np.r_[np.flatnonzero(codes[1:] != codes[:-1]), len(codes) - 1]
+
+    summaries = {}
+    for position in last:
+        code = codes[position]
+        summaries[sets['names'][code]] = {
+            'sessions': int(session_count[code]),
+            'last_session': sessions['day'][position].item().isoformat(),
+            'best_e1rm': _number(best[code]),
+            'latest_e1rm': _number(sessions['e1rm'][position]),
+            'rolling_e1rm': _number(sessions['rolling'][position]),
+            'trend_per_week': _number(trend[code], 2),
+            'tonnage': _number(tonnage[code]),
+        }
+    return summaries
+
+
+def exercise_series(session, user_id, exercise, formula='epley', window=5):
+    # -> {'dates', 'e1rm', 'rolling', 'tonnage', 'trend_per_week'}, one value per session of the exercise
+    sets = load_sets(session, user_id, exercise)
+    if sets is None:
+        return {'dates': [], 'e1rm': [], 'rolling': [], 'tonnage': [], 'trend_per_week': None}
+    sessions = session_figures(sets, formula, window)
+    return {
+        'dates': [day.isoformat() for day in sessions['day'].tolist()],
+        'e1rm': [_number(value) for value in sessions['e1rm']],
+        'rolling': [_number(value) for value in sessions['rolling']],
+        'tonnage': [_number(value) for value in sessions['tonnage']],
+        'trend_per_week': _number(weekly_trend(sessions, 1)[0], 2),
+    }
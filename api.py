@@ -0,0 +1,297 @@
+# read-only json api over the user's training log, for clients that want the data rather than the html pages.
+#   GET /api/exercises?limit=50&cursor=...&fields=date,exercise,weight&workout=Leg Day&exercise=Squat
+#   GET /api/completed-routines?limit=50&cursor=...&fields=date,workout
+# results are newest first and paginated with keyset cursors on (date, id): every page is one indexed range read
+# no matter how deep into the history it is, and a write between two page loads can't shift rows across pages.
+# `fields` picks which schema fields are returned, `next_cursor` is null on the last page.
+#
+#   GET /api/export?format=csv|ndjson&gzip=1
+# streams the user's full log as a file download, see export() below.
+#
+#   POST /api/import, GET /api/import/<job_id>
+# loads a csv history in batches (importer.py) on a background job, and reports how far it got.
+#
+#   GET /api/analytics?formula=epley|brzycki&window=5&exercise=Squat
+# estimated 1rm, tonnage, rolling average and trend (analytics.py): per exercise over the whole history, or session
+# by session for one exercise. cached until the user's next write, read from the replica when there is one
+# (replica.py).
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import date
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import select, tuple_
+
+from analytics import FORMULAS, exercise_series, exercise_summaries
+from conditional import data_version, note_data_change
+from importer import ImportFailed, get_job, job_status, resume_job, run_import, start_job
+from models import (db, CompletedRoutines, CompletedRoutinesSchema, ExerciseNames, Exercises, ExercisesSchema,
+                    WorkoutNames)
+from names import EXERCISE_NAMES, WORKOUT_NAMES, name_id
+from replica import replica_reads
+
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(row_date, row_id):
+    payload = json.dumps([row_date.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        row_date, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(row_date), int(row_id)
+    except (ValueError, TypeError):
+        abort(400, description='invalid cursor')
+
+
+def page_size():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400, description='limit must be a number')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def projected_schema(schema_class):
+    fields = request.args.get('fields')
+    if not fields:
+        return schema_class()
+    try:
+        return schema_class(only=[field.strip() for field in fields.split(',') if field.strip()])
+    except ValueError as error:
+        abort(400, description=str(error))
+
+
+def empty_page(key):
+    return jsonify({key: [], 'next_cursor': None})
+
+
+def paginate(query, date_column, id_column, schema, key):
+    # fetches one row past the page to know whether there's a next page
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(tuple_(date_column, id_column) < decode_cursor(cursor))
+    limit = page_size()
+    rows = query.order_by(date_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_column.key), getattr(last, id_column.key))
+    return jsonify({key: [schema.dump(row) for row in rows], 'next_cursor': next_cursor})
+
+
+@api.route('/exercises')
+@login_required
+def exercises():
+    query = Exercises.query.filter(Exercises.user_id == current_user.id)
+    # the filters are name ids, a name the user never logged has no rows
+    if request.args.get('workout'):
+        workout_name_id = name_id(db.session, WORKOUT_NAMES, current_user.id, request.args['workout'])
+        if workout_name_id is None:
+            return empty_page('exercises')
+        query = query.filter(Exercises.workout_name_id == workout_name_id)
+    if request.args.get('exercise'):
+        exercise_name_id = name_id(db.session, EXERCISE_NAMES, current_user.id, request.args['exercise'])
+        if exercise_name_id is None:
+            return empty_page('exercises')
+        query = query.filter(Exercises.exercise_name_id == exercise_name_id)
+    return paginate(query, Exercises.date, Exercises.exercise_id, projected_schema(ExercisesSchema), 'exercises')
+
+
+@api.route('/completed-routines')
+@login_required
+def completed_routines():
+    query = CompletedRoutines.query.filter(CompletedRoutines.user_id == current_user.id)
+    if request.args.get('workout'):
+        workout_name_id = name_id(db.session, WORKOUT_NAMES, current_user.id, request.args['workout'])
+        if workout_name_id is None:
+            return empty_page('completed_routines')
+        query = query.filter(CompletedRoutines.workout_name_id == workout_name_id)
+    return paginate(query, CompletedRoutines.date, CompletedRoutines.routine_id,
+                    projected_schema(CompletedRoutinesSchema), 'completed_routines')
+
+
+# columns of the export, in file order
+EXPORT_COLUMNS = ['date', 'workout', 'exercise', 'sets', 'reps', 'weight']
+# rows fetched from the server-side cursor (and written out) at a time
+EXPORT_CHUNK_SIZE = 1000
+
+
+def export_rows(user_id):
+    # streams the user's whole log oldest first through a server-side cursor (stream_results), so only one chunk
+    # of rows is ever held in memory however long the history is. runs on its own connection because the
+    # response body is generated after the view has returned
+    table, workouts, exercise_names = Exercises.__table__, WorkoutNames.__table__, ExerciseNames.__table__
+    query = select(table.c.date, workouts.c.name.label('workout'), exercise_names.c.name.label('exercise'),
+                   table.c.sets, table.c.reps, table.c.weight).select_from(
+        table.outerjoin(workouts, workouts.c.id == table.c.workout_name_id)
+             .outerjoin(exercise_names, exercise_names.c.id == table.c.exercise_name_id)
+    ).where(
+        table.c.user_id == user_id
+    ).order_by(table.c.date, table.c.exercise_id)
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=EXPORT_CHUNK_SIZE).execute(query)
+        for chunk in result.partitions(EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+def csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows((row.date.isoformat(), *row[1:]) for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, (row.date.isoformat(), *row[1:])))) + '\n'
+                      for row in chunk).encode()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_chunks, 'text/csv'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
+
+
+@api.route('/export')
+@login_required
+def export():
+    # the whole training log as a download, generated while it's sent
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        abort(400, description=f'format must be one of {", ".join(EXPORT_FORMATS)}')
+    serialize, mimetype = EXPORT_FORMATS[export_format]
+    filename = f'strengthjournal-export.{export_format}'
+
+    body = serialize(export_rows(current_user.id))
+    if request.args.get('gzip') in ('1', 'true'):
+        body, mimetype, filename = gzipped(body), 'application/gzip', filename + '.gz'
+    return Response(stream_with_context(body), mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def job_summary(job):
+    status = job_status(job, current_app.config['IMPORT_STALLED_SECONDS'])
+    return {'job_id': job.id, 'status': status, 'rows_imported': job.rows_committed, 'error': job.error,
+            'resumable': status in ('failed', 'stalled')}
+
+
+def import_file(job_id, path):
+    # the background job behind POST /api/import. a failure is recorded on the job, GET /api/import/<id> reports it
+    job = get_job(db.engine, job_id)
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as lines:
+            run_import(db.engine, job, lines)
+    except ImportFailed:
+        pass
+    finally:
+        os.remove(path)
+        # the batches were committed on their own connections, whatever got in counts as a change
+        note_data_change(db.session, job.user_id)
+        db.session.commit()
+        current_app.extensions['analytics_cache'].invalidate_user(job.user_id)
+
+
+@api.route('/import', methods=['POST'])
+@login_required
+def import_history():
+    #   POST /api/import  (multipart: file=<csv>, optional job_id=<id> to resume a failed or stalled import with the
+    #   same file)
+    # a large history takes longer than a request is allowed to, so the upload is saved to a temporary file and
+    # loaded by a background job (jobs.py). the response is the job, poll GET /api/import/<job_id> until it's done.
+    # a job lost with its worker stays 'running' until it counts as stalled, then it can be resumed
+    upload = request.files.get('file')
+    if upload is None:
+        abort(400, description='attach the csv as "file"')
+    try:
+        if request.form.get('job_id'):
+            job = resume_job(db.engine, int(request.form['job_id']), current_user.id,
+                             current_app.config['IMPORT_STALLED_SECONDS'])
+        else:
+            job = start_job(db.engine, current_user.id, upload.filename)
+    except ValueError as error:
+        abort(400, description=str(error))
+
+    descriptor, path = tempfile.mkstemp(prefix=f'import-{job.id}-', suffix='.csv')
+    with os.fdopen(descriptor, 'wb') as spooled:
+        upload.save(spooled)
+    if not current_app.extensions['jobs'].submit(current_user.id, f'import {job.id}', import_file, job.id, path):
+        os.remove(path)
+    # the job has already run when it ran inline (JOBS_WORKERS = 0, or a full queue)
+    job = get_job(db.engine, job.id)
+    status = {'done': 200, 'failed': 422}.get(job.status, 202)
+    return jsonify(job_summary(job)), status
+
+
+@api.route('/import/<int:job_id>')
+@login_required
+def import_status(job_id):
+    job = get_job(db.engine, job_id)
+    if job is None or job.user_id != current_user.id:
+        abort(404)
+    return jsonify(job_summary(job))
+
+
+def training_summaries(user_id, formula=None, window=None):
+    # analytics.exercise_summaries through the analytics cache, the routine dashboard reads it too
+    formula = formula or current_app.config['ANALYTICS_FORMULA']
+    window = window or current_app.config['ANALYTICS_ROLLING_SESSIONS']
+    return current_app.extensions['analytics_cache'].get_or_compute(
+        user_id, data_version(user_id), 'training_summaries', lambda: exercise_summaries(db.session, user_id, formula, window),
+        formula, window
+    )
+
+
+@api.route('/analytics')
+@login_required
+@replica_reads
+def analytics():
+    formula = request.args.get('formula', current_app.config['ANALYTICS_FORMULA'])
+    if formula not in FORMULAS:
+        abort(400, description=f'formula must be one of {", ".join(FORMULAS)}')
+    try:
+        window = int(request.args.get('window', current_app.config['ANALYTICS_ROLLING_SESSIONS']))
+    except ValueError:
+        abort(400, description='window must be a number')
+    if window < 1:
+        abort(400, description='window must be at least 1')
+
+    user_id = current_user.id
+    exercise = request.args.get('exercise')
+    if exercise is None:
+        summaries = training_summaries(user_id, formula, window)
+        return jsonify({'formula': formula, 'window': window, 'exercises': summaries})
+    series = current_app.extensions['analytics_cache'].get_or_compute(
+        user_id, data_version(user_id), 'exercise_series', lambda: exercise_series(db.session, user_id, exercise, formula, window),
+        exercise, formula, window
+    )
+    return jsonify({'formula': formula, 'window': window, 'exercise': exercise, **series})
@@ -0,0 +1,59 @@
+# batched write path for the form endpoints. the rows of a submitted form are validated up front, then written with
+# one executemany per batch (psycopg2 turns it into multi-row INSERT ... VALUES statements) inside the request's
+# transaction, so a whole workout costs a single commit instead of one statement (or commit) per exercise
+from datetime import datetime
+
+
+# rows per INSERT statement, keeps the statements a sensible size for the bigger batches
+BATCH_SIZE = 1000
+
+
+def optional_number(value, cast, field):
+    if value is None or value.strip() == '':
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a number, got '{value}'")
+
+
+def parse_workout_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Please enter a valid date for the workout.")
+
+
+def parse_logged_exercises(form, user_id):
+    # turns the Exercise{i}/Workout{i}/Sets{i}/Reps{i}/Weight{i} fields posted by entry.html into exercises rows.
+    # an exercise with no weight is still logged, just without its sets/reps/weight. raises ValueError on bad input
+    workout_date = parse_workout_date(form.get("workout_date"))
+    number_of_exercises = optional_number(form.get("Number_of_Exercises"), int, "Number of exercises") or 0
+
+    rows = []
+    for i in range(1, number_of_exercises + 1):
+        exercise = form.get(f"Exercise{i}")
+        workout = form.get(f"Workout{i}")
+        if not exercise or not workout:
+            raise ValueError(f"Exercise {i} is missing its name or routine.")
+        weight = optional_number(form.get(f"Weight{i}"), float, f"{exercise} weight")
+        if weight is None:
+            sets = reps = None
+        else:
+            sets = optional_number(form.get(f"Sets{i}"), int, f"{exercise} sets")
+            reps = optional_number(form.get(f"Reps{i}"), int, f"{exercise} reps")
+        rows.append({'user_id': user_id, 'date': workout_date, 'workout': workout, 'exercise': exercise,
+                     'sets': sets, 'reps': reps, 'weight': weight})
+    return rows
+
+
+def batches(rows, batch_size=BATCH_SIZE):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def insert_rows(session, table, rows, batch_size=BATCH_SIZE):
+    # executemany per batch on the session (or connection). nothing is committed here, the caller commits once
+    for batch in batches(rows, batch_size):
+        session.execute(table.insert(), batch)
+    return len(rows)
@@ -0,0 +1,166 @@
+# cache for the computed dashboard view models. the figures only change when the user writes (logs a workout,
+# deletes or edits a routine), so every entry is keyed on the user's data_version from the database, the same number
+# the pages' etags are made of (see conditional.py). every write bumps it, so no worker can read figures from before
+# the write, whichever worker handled it. entries from an older version are never read again: the worker that
+# handled the write drops them (invalidate_user), the others' age out of the backend on their own.
+#
+# backends:
+#   memory -> in-process LRU with a TTL. fastest, every gunicorn worker keeps its own copy
+#   sqlite -> a sqlite file shared by every worker on the host, a result computed by one is reused by all of them
+#   null   -> caching switched off
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is MISSING:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            prefix = f'{user_id}:'
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    def __init__(self, path, max_entries=20000, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                               '(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value BLOB NOT NULL)')
+
+    def _connection(self):
+        # one connection per thread (and per process, a forked worker opens its own)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute('SELECT expires_at, value FROM cache_entries WHERE key = ?',
+                                         (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            return MISSING
+        return pickle.loads(row[1])
+
+    def set(self, key, value):
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO cache_entries (key, expires_at, value) VALUES (?, ?, ?)',
+                           (key, time.time() + self.ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        # every so often clear out the expired entries and keep the file under max_entries
+        if hash(key) % 100 == 0:
+            connection.execute('DELETE FROM cache_entries WHERE expires_at < ?', (time.time(),))
+            connection.execute('DELETE FROM cache_entries WHERE key NOT IN '
+                               '(SELECT key FROM cache_entries ORDER BY expires_at DESC LIMIT ?)',
+                               (self.max_entries,))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def delete_user(self, user_id):
+        self._connection().execute('DELETE FROM cache_entries WHERE key LIKE ?', (f'{user_id}:%',))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+
+class NullBackend:
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def delete_user(self, user_id):
+        pass
+
+    def clear(self):
+        pass
+
+
+class AnalyticsCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def key(self, user_id, version, name, *parts):
+        # '<user>:v<data_version>:<view model>:<routine>:<exercise>'
+        return ':'.join([str(user_id), f'v{version}', name] + ['' if part is None else str(part) for part in parts])
+
+    def get_or_compute(self, user_id, version, name, compute, *parts):
+        # version is the user's data_version, see conditional.data_version()
+        key = self.key(user_id, version, name, *parts)
+        value = self.backend.get(key)
+        if value is MISSING:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def invalidate_user(self, user_id):
+        # after a write: the new data_version already keeps the user's entries from being read, this frees them
+        self.backend.delete_user(user_id)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def create_cache(config):
+    backend_name = config.get('ANALYTICS_CACHE', 'memory')
+    ttl = int(config.get('ANALYTICS_CACHE_TTL', 300))
+    if backend_name == 'memory':
+        backend = MemoryBackend(max_entries=int(config.get('ANALYTICS_CACHE_SIZE', 2048)), ttl=ttl)
+    elif backend_name == 'sqlite':
+        backend = SQLiteBackend(config.get('ANALYTICS_CACHE_PATH', 'analytics_cache.db'),
+                                max_entries=int(config.get('ANALYTICS_CACHE_SIZE', 20000)), ttl=ttl)
+    elif backend_name == 'null':
+        backend = NullBackend()
+    else:
+        raise ValueError(f'unknown ANALYTICS_CACHE backend: {backend_name}')
+    return AnalyticsCache(backend)
@@ -0,0 +1,99 @@
+# chart data for /routine-dashboard over longer ranges than the last 8 sessions. the point count is capped at
+# CHART_POINT_BUDGET whatever the range or the length of the user's history, so the page weighs the same for a
+# user with ten years of logs as for one with ten weeks:
+#   routine overview -> the database buckets the sets into weeks (or months, or wider when even months would go
+#                       over the budget) and returns the heaviest weight per exercise per bucket
+#   one exercise     -> that exercise's logged weights, thinned out to the budget with largest-triangle-three-
+#                       buckets (lttb), which keeps the peaks and dips a plain every-nth sample would drop
+from datetime import date, timedelta
+from math import ceil
+
+import numpy as np
+
+from names import EXERCISE_NAMES, WORKOUT_NAMES, name_id
+from queries import BUCKETED_SERIES, EXERCISE_HISTORY, FIRST_ROUTINE_DATE, fetch, fetch_column
+
+
+# ?range= -> days back from today, None for the whole history. 'recent' is the last 8 sessions chart
+CHART_RANGES = {'recent': None, '3m': 91, '1y': 365, 'all': None}
+
+
+def range_start(session, user_id, routine, chart_range, until):
+    days = CHART_RANGES[chart_range]
+    if days is not None:
+        return until - timedelta(days=days)
+    first_date, = fetch_column(session, FIRST_ROUTINE_DATE, user_id=user_id,
+                               workout_name_id=name_id(session, WORKOUT_NAMES, user_id, routine))
+    return first_date or until
+
+
+def bucket_width(span_days, budget):
+    # weekly buckets when they fit the budget, then monthly, then whatever width does
+    for width in (7, 30):
+        if span_days // width + 1 <= budget:
+            return width
+    return ceil((span_days + 1) / budget)
+
+
+def bucketed_chart(session, user_id, routine, since, until, budget):
+    # -> (bucket start dates, {'Squat': [135.0, None, 145.0, ...]}) with one value per bucket, None where the
+    # exercise wasn't done that bucket
+    width = bucket_width((until - since).days, budget)
+    bucket_count = (until - since).days // width + 1
+    routine_dict = {}
+    for row in fetch(session, BUCKETED_SERIES, user_id=user_id,
+                     workout_name_id=name_id(session, WORKOUT_NAMES, user_id, routine), since=since, until=until,
+                     width=width):
+        routine_dict.setdefault(row.exercise, [None] * bucket_count)[row.bucket] = row.weight
+    labels = [since + timedelta(days=bucket * width) for bucket in range(bucket_count)]
+    return labels, routine_dict
+
+
+def lttb(points, budget):
+    # largest-triangle-three-buckets over (x, y) pairs sorted by x: keeps the first and last point and, from each
+    # of budget - 2 equal buckets in between, the point forming the largest triangle with the point kept before
+    # it and the average of the next bucket. the bucket averages come out of one cumsum and each bucket's areas are
+    # a numpy expression, only the walk from bucket to bucket (which depends on the point kept last) is a loop
+    if budget >= len(points) or budget < 3:
+        return list(points)
+    xs = np.array([x for x, y in points], dtype=float)
+    ys = np.array([y for x, y in points], dtype=float)
+    count = len(points)
+    every = (count - 2) / (budget - 2)
+    # bucket i is [bounds[i], bounds[i + 1]), the one after it averages [bounds[i + 1], bounds[i + 2])
+    bounds = np.minimum((np.arange(budget) * every).astype(int) + 1, count)
+    sums_x = np.concatenate(([0.0], np.cumsum(xs)))
+    sums_y = np.concatenate(([0.0], np.cumsum(ys)))
+    next_start, next_end = bounds[1:-1], bounds[2:]
+    sizes = next_end - next_start
+    empty = sizes == 0
+    safe_sizes = np.where(empty, 1, sizes)
+    average_xs = np.where(empty, xs[-1], (sums_x[next_end] - sums_x[next_start]) / safe_sizes)
+    average_ys = np.where(empty, ys[-1], (sums_y[next_end] - sums_y[next_start]) / safe_sizes)
+
+    kept = [0]
+    for i in range(budget - 2):
+        start, end = bounds[i], bounds[i + 1]
+        kept_x, kept_y = xs[kept[-1]], ys[kept[-1]]
+        areas = np.abs((kept_x - average_xs[i]) * (ys[start:end] - kept_y)
+                       - (kept_x - xs[start:end]) * (average_ys[i] - kept_y))
+        kept.append(start + int(np.argmax(areas)))
+    kept.append(count - 1)
+    return [points[i] for i in kept]
+
+
+def downsampled_chart(session, user_id, routine, exercise, since, until, budget):
+    # -> (session dates, {exercise: [weights]}) with at most `budget` sessions
+    history = fetch(session, EXERCISE_HISTORY, user_id=user_id,
+                    workout_name_id=name_id(session, WORKOUT_NAMES, user_id, routine),
+                    exercise_name_id=name_id(session, EXERCISE_NAMES, user_id, exercise), since=since, until=until)
+    points = lttb([(row.date.toordinal(), row.weight) for row in history], budget)
+    return [date.fromordinal(x) for x, y in points], {exercise: [y for x, y in points]} if points else {}
+
+
+def y_axis_bounds(routine_dict):
+    # half the lightest and 1.25x the heaviest weight on the chart, 0 when there's nothing to show
+    weights = [weight for line in routine_dict.values() for weight in line if weight]
+    if not weights:
+        return 0, 0
+    return min(weights) * 0.5, max(weights) * 1.25
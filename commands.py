@@ -0,0 +1,69 @@
+# flask cli commands, e.g. `flask --app server create-db`. creating the schema used to happen every time server.py
+# was imported, now it only happens when asked for
+import click
+
+import migrations
+from conditional import note_data_change
+from activity import rebuild_all_daily_activity
+from importer import ImportFailed, resume_job, run_import, start_job
+from models import db
+from records import rebuild_all_personal_records
+
+
+def register_commands(app):
+    @app.cli.command('create-db')
+    def create_db():
+        """Create any missing tables and indexes, then apply the pending migrations."""
+        db.create_all()
+        migrations.upgrade(db.engine, log=click.echo)
+
+    @app.cli.command('migrate')
+    @click.option('--target', type=int, help='stop after this revision')
+    def migrate(target):
+        """Apply the pending schema migrations."""
+        migrations.upgrade(db.engine, target=target, log=click.echo)
+
+    @app.cli.command('backfill-personal-records')
+    def backfill_personal_records():
+        """Rebuild the personal_records table from the exercises log."""
+        with db.engine.begin() as connection:
+            rebuild_all_personal_records(connection)
+        click.echo('personal_records rebuilt')
+
+    @app.cli.command('backfill-daily-activity')
+    def backfill_daily_activity():
+        """Rebuild the daily_activity rollup from completed_routines."""
+        with db.engine.begin() as connection:
+            rebuild_all_daily_activity(connection)
+        click.echo('daily_activity rebuilt')
+
+    @app.cli.command('import-log')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--user-id', type=int, required=True)
+    @click.option('--resume', 'job_id', type=int, help='resume this failed import instead of starting a new one')
+    @click.option('--batch-size', type=int, default=5000, show_default=True)
+    def import_log(csv_file, user_id, job_id, batch_size):
+        """Import a csv training history (date,workout,exercise,sets,reps,weight) for a user."""
+        if job_id is None:
+            job = start_job(db.engine, user_id, csv_file.name, batch_size=batch_size)
+        else:
+            try:
+                job = resume_job(db.engine, job_id, user_id, app.config['IMPORT_STALLED_SECONDS'])
+            except ValueError as error:
+                raise click.ClickException(str(error))
+        click.echo(f'import {job.id}: starting after row {job.rows_committed}')
+
+        def progress(rows_committed):
+            click.echo(f'import {job.id}: {rows_committed} rows committed')
+
+        try:
+            job = run_import(db.engine, job, csv_file, progress=progress)
+        except ImportFailed as failure:
+            raise click.ClickException(f'import {job.id} stopped after {failure.job.rows_committed} rows: {failure}. '
+                                       f'fix the file and rerun with --resume {job.id}')
+        finally:
+            # the committed batches count as a change even when the import stopped part way
+            note_data_change(db.session, user_id)
+            db.session.commit()
+            app.extensions['analytics_cache'].invalidate_user(user_id)
+        click.echo(f'import {job.id}: done, {job.rows_committed} rows')
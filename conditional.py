@@ -0,0 +1,77 @@
+# conditional gets for the pages that only change when the user's data does (/dashboard, /routine-dashboard,
+# /choose-a-workout). every write bumps the user's data_version with note_data_change() in its own transaction, and
+# the pages carry a strong etag made of everything their html depends on: the user, that version, the day (the
+# dashboard windows end today) and the RELEASE being served. going back and forth between the pages the browser
+# sends If-None-Match and gets a 304 after one primary key lookup, before the view runs any of its queries.
+# Last-Modified is the later of the last change and the start of today, for clients that only send
+# If-Modified-Since. `Cache-Control: private, no-cache` has the browser revalidate every time and keeps shared
+# caches out. a page with a flashed message waiting is always rendered, the message is only shown once.
+from datetime import date, datetime, time, timezone
+from functools import wraps
+
+from flask import current_app, g, has_request_context, make_response, request, session as cookie_session
+from flask_login import current_user
+
+from models import db
+from queries import BUMP_DATA_VERSION, DATA_VERSION, execute, fetch
+from replica import stick_to_primary
+
+
+def note_data_change(session, user_id):
+    # call before the write commits, the bump goes in with it. the user's next pages read the primary for a while
+    # (see replica.py)
+    execute(session, BUMP_DATA_VERSION, user_id=user_id, changed_at=datetime.utcnow())
+    if has_request_context():
+        g.pop('data_version', None)
+    stick_to_primary()
+
+
+def data_version(user_id):
+    # the user's current data_version, what the analytics cache is keyed on (see cache.py). a page under
+    # @conditional has read it already, the cached figures then match the etag they're served under
+    if has_request_context() and g.get('data_version', (None, None))[0] == user_id:
+        return g.data_version[1]
+    rows = fetch(db.session, DATA_VERSION, user_id=user_id)
+    return rows[0][0] if rows else 0
+
+
+def page_validators(user_id, version, changed_at, today):
+    # -> (etag, last modified as an aware utc datetime)
+    release = current_app.config['RELEASE']
+    etag = f'u{user_id}-v{version}-{today:%Y%m%d}' + (f'-{release}' if release else '')
+    start_of_today = datetime.combine(today, time()).astimezone(timezone.utc)
+    if changed_at is None:
+        return etag, start_of_today
+    # http dates have whole seconds
+    return etag, max(changed_at.replace(tzinfo=timezone.utc, microsecond=0), start_of_today)
+
+
+def conditional(view):
+    # goes under @login_required
+    @wraps(view)
+    def conditional_view(*args, **kwargs):
+        if '_flashes' in cookie_session:
+            return view(*args, **kwargs)
+        rows = fetch(db.session, DATA_VERSION, user_id=current_user.id)
+        if not rows:
+            return view(*args, **kwargs)
+        version, changed_at = rows[0]
+        g.data_version = (current_user.id, version)
+        etag, last_modified = page_validators(current_user.id, version, changed_at, date.today())
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return conditional_view
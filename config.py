@@ -0,0 +1,91 @@
+import os
+
+
+def normalize_database_url(url):
+    # heroku still hands out postgres:// urls, which sqlalchemy 1.4 no longer accepts
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+class Config:
+    # flask Key
+    # bad practice to have this exposed, I know, need to store as env variable
+    SECRET_KEY = os.getenv('SECRET_KEY', 'Zr4u7w!z%C*F-JaNdRgUkXp2s5v8y/A?')
+
+    # there's deliberately no default: without DATABASE_URL the app (and its create-db / migrate commands) refuses
+    # to start rather than fall back on some database it wasn't pointed at, see server.create_app()
+    SQLALCHEMY_DATABASE_URI = normalize_database_url(os.getenv('DATABASE_URL', ''))
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # connection pool of the one engine every query uses, see pool.py
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # seconds between "pool stats" log lines from each worker, 0 switches them off
+    POOL_STATS_LOG_INTERVAL = int(os.getenv('POOL_STATS_LOG_INTERVAL', 0))
+
+    # comma separated emails of the users who can see /pool-stats and /job-stats, nobody when unset (see admin.py)
+    ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+    # the embedded mode: DATABASE_URL=sqlite:///workout_log.db (relative to the app) runs on a sqlite file with
+    # these pragmas and one long-lived connection per worker, see pool.py. SQLITE_BUSY_TIMEOUT is how many seconds a
+    # write waits for another worker's to finish
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'wal')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'normal')
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+
+    # a read replica of DATABASE_URL for /dashboard, /routine-dashboard and /api/analytics, see replica.py. empty
+    # keeps every query on the primary. after a write the user reads the primary for REPLICA_STICKY_SECONDS, which
+    # should be longer than the replica usually lags. the replica's pool is sized like the primary's
+    REPLICA_DATABASE_URL = normalize_database_url(os.getenv('REPLICA_DATABASE_URL', ''))
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 15))
+
+    # cache for the computed dashboard figures, see cache.py
+    ANALYTICS_CACHE = os.getenv('ANALYTICS_CACHE', 'memory')
+    ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 300))
+    ANALYTICS_CACHE_PATH = os.getenv('ANALYTICS_CACHE_PATH', 'analytics_cache.db')
+
+    # the day ranges /dashboard can show its cards for (?window=), and the one it shows by default
+    DASHBOARD_WINDOWS = (7, 30, 90, 365)
+    DASHBOARD_WINDOW = int(os.getenv('DASHBOARD_WINDOW', 30))
+
+    # most points a /routine-dashboard chart over 3 months, a year or all time can have, see charts.py
+    CHART_POINT_BUDGET = int(os.getenv('CHART_POINT_BUDGET', 60))
+
+    # estimated 1rm formula (epley or brzycki) and rolling average length in sessions, see analytics.py
+    ANALYTICS_FORMULA = os.getenv('ANALYTICS_FORMULA', 'epley')
+    ANALYTICS_ROLLING_SESSIONS = int(os.getenv('ANALYTICS_ROLLING_SESSIONS', 5))
+
+    # background jobs (cache warming after a write, csv imports), see jobs.py. 0 workers runs them inline
+    JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+    JOBS_QUEUE_SIZE = int(os.getenv('JOBS_QUEUE_SIZE', 100))
+    JOBS_DRAIN_TIMEOUT = int(os.getenv('JOBS_DRAIN_TIMEOUT', 10))
+
+    # seconds a running csv import can go without committing a batch before it counts as stalled and can be resumed,
+    # see importer.py. a batch takes well under a second, this is a worker that died mid import
+    IMPORT_STALLED_SECONDS = int(os.getenv('IMPORT_STALLED_SECONDS', 300))
+
+    # the deploy being served, part of the pages' etags so a release with new templates isn't answered with a 304
+    # (see conditional.py). heroku's dyno metadata sets HEROKU_RELEASE_VERSION
+    RELEASE = os.getenv('RELEASE', os.getenv('HEROKU_RELEASE_VERSION', ''))
+
+    # per-process cache of the logged in users, see load_user in server.py
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+
+    # per-process cache of the routine and exercise name <-> id pairs, see names.py. the pairs never change, the ttl
+    # only lets the names of users who stopped coming age out
+    NAME_CACHE_SIZE = int(os.getenv('NAME_CACHE_SIZE', 50000))
+    NAME_CACHE_TTL = int(os.getenv('NAME_CACHE_TTL', 86400))
+
+    # run the views' statements as server-side prepared statements (postgres only), see queries.py
+    PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS', 'false').lower() == 'true'
+
+    # per-request query counts and timings (Server-Timing header and a log line) plus a log of every statement
+    # slower than SLOW_QUERY_MS, see instrumentation.py. off by default
+    QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'false').lower() == 'true'
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
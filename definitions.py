@@ -0,0 +1,80 @@
+# the routines a user has set up and the exercises of each, in order. they used to be exercises rows with no date
+# mixed in with the log, so listing the routines meant a DISTINCT over the user's whole history. now they live in
+# routine_definitions (one row per user + name) and routine_exercises (one row per exercise of a routine), and
+# the workout picker, the entry form and the edit form read a handful of indexed rows however long the log is.
+#
+# a routine exists as long as it has exercises, like it did when its rows in the log were all there was: saving
+# an edit with every exercise removed deletes it, and saving under the name of another routine merges the two.
+# a csv import adds the workouts it brings in. nothing here commits: an edit goes in with the view's changes to the
+# log, an import's routines with the batch that brought them.
+from sqlalchemy import text
+
+
+CREATE_ROUTINE_SQL = text('''
+INSERT INTO routine_definitions (user_id, name) VALUES (:user_id, :routine)
+ON CONFLICT (user_id, name) DO NOTHING
+''')
+
+ROUTINE_ID_SQL = text('SELECT id FROM routine_definitions WHERE user_id = :user_id AND name = :routine')
+
+# appended after the routine's last exercise, an exercise it already has keeps its place
+ADD_EXERCISE_SQL = text('''
+INSERT INTO routine_exercises (routine_id, exercise, position)
+SELECT :routine_id, :exercise, COALESCE(MAX(position) + 1, 0) FROM routine_exercises WHERE routine_id = :routine_id
+ON CONFLICT (routine_id, exercise) DO NOTHING
+''')
+
+CLEAR_EXERCISES_SQL = text('DELETE FROM routine_exercises WHERE routine_id = :routine_id')
+RENAME_ROUTINE_SQL = text('UPDATE routine_definitions SET name = :new_routine WHERE id = :routine_id')
+DELETE_ROUTINE_SQL = text('DELETE FROM routine_definitions WHERE id = :routine_id')
+DELETE_IF_EMPTY_SQL = text('''
+DELETE FROM routine_definitions WHERE id = :routine_id
+AND NOT EXISTS (SELECT 1 FROM routine_exercises WHERE routine_id = :routine_id)
+''')
+
+
+def routine_id(connection, user_id, routine):
+    row = connection.execute(ROUTINE_ID_SQL, {'user_id': user_id, 'routine': routine}).first()
+    return row[0] if row else None
+
+
+def add_routine(connection, user_id, routine, exercises):
+    # creates the routine if it's new and appends the exercises it doesn't have yet
+    connection.execute(CREATE_ROUTINE_SQL, {'user_id': user_id, 'routine': routine})
+    new_id = routine_id(connection, user_id, routine)
+    exercises = [exercise for exercise in dict.fromkeys(exercises) if exercise]
+    if exercises:
+        connection.execute(ADD_EXERCISE_SQL, [{'routine_id': new_id, 'exercise': exercise} for exercise in exercises])
+    return new_id
+
+
+def add_logged_routines(connection, user_id, rows):
+    # makes sure every workout in the logged exercises rows (a csv import) is a routine with those exercises
+    routines = {}
+    for row in rows:
+        if row['workout'] is not None:
+            routines.setdefault(row['workout'], {})[row['exercise']] = None
+    for routine, exercises in routines.items():
+        add_routine(connection, user_id, routine, exercises)
+
+
+def delete_routine_definition(connection, user_id, routine):
+    old_id = routine_id(connection, user_id, routine)
+    if old_id is not None:
+        connection.execute(CLEAR_EXERCISES_SQL, {'routine_id': old_id})
+        connection.execute(DELETE_ROUTINE_SQL, {'routine_id': old_id})
+
+
+def save_routine_definition(connection, user_id, old_routine, new_routine, exercises):
+    # the edit form's save: the routine is renamed to new_routine and holds exactly `exercises`, or, when
+    # new_routine is another existing routine, `exercises` are added to that one
+    old_id = routine_id(connection, user_id, old_routine)
+    if old_id is not None:
+        connection.execute(CLEAR_EXERCISES_SQL, {'routine_id': old_id})
+        if new_routine != old_routine:
+            if routine_id(connection, user_id, new_routine) is None:
+                connection.execute(RENAME_ROUTINE_SQL, {'routine_id': old_id, 'new_routine': new_routine})
+            else:
+                connection.execute(DELETE_ROUTINE_SQL, {'routine_id': old_id})
+    new_id = add_routine(connection, user_id, new_routine, exercises)
+    connection.execute(DELETE_IF_EMPTY_SQL, {'routine_id': new_id})
@@ -0,0 +1,30 @@
+# gunicorn picks this file up from the working directory. the hooks keep forked workers off the master's database
+# connections (which matters once the app is preloaded), and on the way out let each worker finish its queued
+# background jobs (jobs.py) and close its pool cleanly.
+import logging
+
+
+def when_ready(server):
+    from config import Config
+    per_worker = Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW
+    server.log.info(f'{server.cfg.workers} workers x (pool {Config.DB_POOL_SIZE} + overflow '
+                    f'{Config.DB_MAX_OVERFLOW}) = up to {server.cfg.workers * per_worker} database connections')
+    if Config.REPLICA_DATABASE_URL:
+        server.log.info(f'and up to {server.cfg.workers * per_worker} more to the read replica')
+
+
+def post_fork(server, worker):
+    from pool import dispose_engines
+    dispose_engines(close=False)
+    # the app's loggers (strengthjournal.*) write to gunicorn's error log
+    app_logger = logging.getLogger('strengthjournal')
+    app_logger.handlers = server.log.error_log.handlers
+    app_logger.setLevel(logging.INFO)
+
+
+def worker_exit(server, worker):
+    # the queued background jobs still need the database, so they finish before the pool is closed
+    from jobs import drain_executors
+    from pool import dispose_engines
+    drain_executors()
+    dispose_engines(close=True)
@@ -0,0 +1,179 @@
+# bulk import of a training history from csv, for users moving over from a spreadsheet or another app. the file
+# has the same columns as the export (/api/export): date (YYYY-MM-DD), workout, exercise, sets, reps, weight.
+#
+# the file is read and validated one row at a time and loaded in fixed-size batches: COPY on postgres,
+# executemany anywhere else. every (date, workout) pair becomes a completed_routines row (and counts in the
+# daily_activity rollup), every workout a routine with its exercises (definitions.py). each batch commits
+# together with the job's progress in import_jobs, so after a failure the import resumes right after the last
+# committed batch instead of starting over (or loading the same rows twice). a job whose worker died mid import
+# (killed, restarted, redeployed) is left 'running' without moving on, after IMPORT_STALLED_SECONDS without a
+# committed batch it counts as stalled and can be resumed like a failed one.
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from activity import record_completed_routines
+from bulk import insert_rows, optional_number
+from definitions import add_logged_routines
+from models import CompletedRoutines, Exercises, ImportJobs
+from names import encode_exercise_rows
+from records import rebuild_personal_records
+
+
+IMPORT_COLUMNS = ['date', 'workout', 'exercise', 'sets', 'reps', 'weight']
+BATCH_SIZE = 5000
+
+EXERCISE_COLUMNS = ['user_id', 'date', 'workout_name_id', 'exercise_name_id', 'sets', 'reps', 'weight']
+ROUTINE_COLUMNS = ['user_id', 'date', 'workout_name_id']
+
+
+class ImportFailed(Exception):
+    def __init__(self, job, message):
+        super().__init__(message)
+        self.job = job
+
+
+def parse_rows(lines, user_id):
+    # yields one exercises row per csv line, raising ValueError (with the line number) on the first bad one
+    reader = csv.DictReader(lines)
+    missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"the file is missing the column(s): {', '.join(missing)}")
+    for row in reader:
+        line = reader.line_num
+        try:
+            session_date = date.fromisoformat(row['date'].strip())
+        except (AttributeError, ValueError):
+            raise ValueError(f"line {line}: '{row['date']}' is not a YYYY-MM-DD date")
+        workout = (row['workout'] or '').strip()
+        exercise = (row['exercise'] or '').strip()
+        if not workout or not exercise:
+            raise ValueError(f'line {line}: workout and exercise are required')
+        try:
+            yield {'user_id': user_id, 'date': session_date, 'workout': workout, 'exercise': exercise,
+                   'sets': optional_number(row['sets'], int, 'sets'),
+                   'reps': optional_number(row['reps'], int, 'reps'),
+                   'weight': optional_number(row['weight'], float, 'weight')}
+        except ValueError as error:
+            raise ValueError(f'line {line}: {error}')
+
+
+def batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy(connection, table, columns, rows):
+    # COPY ... FROM STDIN through the connection's psycopg2 cursor, inside the same transaction
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '')", buffer)
+
+
+def load_batch(connection, exercise_rows, routine_rows):
+    if connection.dialect.name == 'postgresql':
+        _copy(connection, Exercises.__tablename__, EXERCISE_COLUMNS, exercise_rows)
+        _copy(connection, CompletedRoutines.__tablename__, ROUTINE_COLUMNS, routine_rows)
+    else:
+        insert_rows(connection, Exercises.__table__, exercise_rows)
+        insert_rows(connection, CompletedRoutines.__table__, routine_rows)
+
+
+def start_job(engine, user_id, source, batch_size=BATCH_SIZE):
+    with engine.begin() as connection:
+        now = datetime.utcnow()
+        result = connection.execute(ImportJobs.__table__.insert().values(
+            user_id=user_id, source=source, batch_size=batch_size, rows_committed=0, status='running',
+            created_at=now, updated_at=now
+        ))
+        job_id = result.inserted_primary_key[0]
+    return get_job(engine, job_id)
+
+
+def get_job(engine, job_id):
+    with engine.connect() as connection:
+        return connection.execute(ImportJobs.__table__.select().where(ImportJobs.__table__.c.id == job_id)).first()
+
+
+def _update_job(connection, job_id, **values):
+    jobs = ImportJobs.__table__
+    connection.execute(jobs.update().where(jobs.c.id == job_id).values(updated_at=datetime.utcnow(), **values))
+
+
+def run_import(engine, job, lines, progress=None):
+    # loads `lines` (the whole csv, header included) for the job. rows the job already committed are parsed again
+    # but skipped, so a resumed job picks up where it stopped. raises ImportFailed, leaving the job resumable
+    user_id, rows_committed = job.user_id, job.rows_committed
+    rows = parse_rows(lines, user_id)
+    # sessions already turned into completed_routines rows, including the ones from batches before a resume
+    seen_sessions = set()
+
+    try:
+        for skipped, row in zip(range(rows_committed), rows):
+            seen_sessions.add((row['date'], row['workout']))
+
+        for batch in batches(rows, job.batch_size):
+            sessions = []
+            for row in batch:
+                session = (row['date'], row['workout'])
+                if session not in seen_sessions:
+                    seen_sessions.add(session)
+                    sessions.append(session)
+            with engine.begin() as connection:
+                # the batch's names become ids in the same transaction
+                exercise_rows = encode_exercise_rows(connection, user_id, batch)
+                workout_ids = {row['workout']: ids['workout_name_id'] for row, ids in zip(batch, exercise_rows)}
+                routine_rows = [{'user_id': user_id, 'date': session_date, 'workout_name_id': workout_ids[workout]}
+                                for session_date, workout in sessions]
+                load_batch(connection, exercise_rows, routine_rows)
+                record_completed_routines(connection, routine_rows)
+                add_logged_routines(connection, user_id, batch)
+                rows_committed += len(batch)
+                _update_job(connection, job.id, rows_committed=rows_committed)
+            if progress:
+                progress(rows_committed)
+    except Exception as error:
+        with engine.begin() as connection:
+            _update_job(connection, job.id, status='failed', error=str(error)[:1000])
+        if rows_committed > job.rows_committed:
+            # the batches committed before the failure are in the log and daily_activity already, the records
+            # catch up with them too rather than waiting for a resume
+            with engine.begin() as connection:
+                rebuild_personal_records(connection, user_id)
+        raise ImportFailed(get_job(engine, job.id), str(error)) from error
+
+    with engine.begin() as connection:
+        rebuild_personal_records(connection, user_id)
+        _update_job(connection, job.id, status='done', error=None)
+    return get_job(engine, job.id)
+
+
+def job_status(job, stalled_after):
+    # the job's status, with 'stalled' for a running job that hasn't committed a batch for `stalled_after` seconds
+    if job.status == 'running' and job.updated_at < datetime.utcnow() - timedelta(seconds=stalled_after):
+        return 'stalled'
+    return job.status
+
+
+def resume_job(engine, job_id, user_id, stalled_after):
+    job = get_job(engine, job_id)
+    if job is None or job.user_id != user_id:
+        raise ValueError(f'there is no import {job_id} for this user')
+    status = job_status(job, stalled_after)
+    if status == 'done':
+        raise ValueError(f'import {job_id} already finished')
+    if status == 'running':
+        raise ValueError(f'import {job_id} is still running')
+    with engine.begin() as connection:
+        _update_job(connection, job_id, status='running', error=None)
+    return get_job(engine, job_id)
@@ -0,0 +1,106 @@
+# per-request database timing. when QUERY_INSTRUMENTATION is on, every statement run on the app's engines is timed
+# through sqlalchemy's cursor events and each request ends up with
+#   - a Server-Timing header:  db;dur=12.4;desc="7 queries", render;dur=3.1, total;dur=18.0
+#     (shows up in the browser devtools timing tab)
+#   - one json log line on strengthjournal.queries:
+#     {"method": "GET", "path": "/routine-dashboard", "status": 200, "queries": 7, "db_ms": 12.4, ...}
+#   - a warning with the normalized sql of any statement slower than SLOW_QUERY_MS
+# when it's off nothing is registered at all, so the hot paths don't pay for it.
+import json
+import logging
+import re
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+from pool import app_engines
+
+
+logger = logging.getLogger('strengthjournal.queries')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    # one line, literals replaced by ? and IN lists folded, so the same query always logs the same text
+    # (and the user ids baked into the older f-string queries don't end up in the log)
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany, slow_query_ms):
+    elapsed_ms = (time.perf_counter() - connection.info['query_started'].pop()) * 1000
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_ms += elapsed_ms
+    if elapsed_ms >= slow_query_ms:
+        logger.warning('slow query %.1f ms: %s', elapsed_ms, normalize_sql(statement))
+
+
+def _instrument_engine(engine, slow_query_ms):
+    def after_cursor_execute(*args):
+        _after_cursor_execute(*args, slow_query_ms=slow_query_ms)
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def server_timing(timings):
+    return ', '.join([f'db;dur={timings["db_ms"]};desc="{timings["queries"]} queries"',
+                      f'render;dur={timings["render_ms"]}', f'total;dur={timings["total_ms"]}'])
+
+
+def init_instrumentation(app):
+    if not app.config['QUERY_INSTRUMENTATION']:
+        return
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+    instrumented = []
+
+    @app.before_request
+    def start_timing():
+        # flask-sqlalchemy only builds the engine on first use, so the listeners go on here rather than in
+        # create_app(). the engine object survives dispose() after a fork, the listeners with it
+        if not instrumented:
+            with app.app_context():
+                for engine in app_engines(app):
+                    _instrument_engine(engine, slow_query_ms)
+            instrumented.append(True)
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_ms = 0.0
+        g.render_ms = 0.0
+
+    def start_render(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def finish_render(sender, template, context, **extra):
+        if 'render_started' in g:
+            g.render_ms += (time.perf_counter() - g.pop('render_started')) * 1000
+
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(finish_render, app, weak=False)
+
+    @app.after_request
+    def finish_timing(response):
+        if 'request_started' not in g:
+            return response
+        timings = {
+            'queries': g.db_queries,
+            'db_ms': round(g.db_ms, 1),
+            'render_ms': round(g.render_ms, 1),
+            'total_ms': round((time.perf_counter() - g.request_started) * 1000, 1),
+        }
+        response.headers['Server-Timing'] = server_timing(timings)
+        logger.info(json.dumps({'method': request.method, 'path': request.path, 'endpoint': request.endpoint,
+                                'status': response.status_code, **timings}))
+        return response
@@ -0,0 +1,178 @@
+# in-process background jobs for the work a write leaves behind (warming the user's cached figures), so the write
+# endpoints can commit, hand the rest over and redirect straight away. only work that is safe to lose goes here: a
+# job can fail or be dropped when a worker shuts down, so anything the data has to agree on (records, the activity
+# rollup) is written in the write's own transaction. the csv imports of /api/import run here too, one committed
+# batch at a time, a lost one is left resumable (importer.py).
+#   - a bounded queue (JOBS_QUEUE_SIZE) served by JOBS_WORKERS threads. the threads start on the first submit, so a
+#     preloaded gunicorn master never forks with them running
+#   - jobs are keyed on (user_id, name). a job submitted while the same key is still waiting in the queue is
+#     dropped, the waiting one runs after the write anyway. so jobs have to be rebuilds that read everything they
+#     need from the database, not increments carrying their own data
+#   - when the queue is full the job runs in the caller's thread: the write gets slower but nothing is lost
+#   - gunicorn.conf.py drains the queue (up to JOBS_DRAIN_TIMEOUT seconds) when a worker shuts down
+#   - GET /job-stats: queue depth, counters and wait/run times of the recent jobs, for ADMIN_EMAILS only (admin.py)
+# JOBS_WORKERS = 0 runs every job inline, for tests and scripts. every job thread can hold a database connection
+# while it runs, on top of the request threads.
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+
+from flask import jsonify
+
+from admin import admin_required
+from models import db
+
+
+logger = logging.getLogger('strengthjournal.jobs')
+
+# every executor built in this process, so the gunicorn hooks can drain them
+_executors = weakref.WeakSet()
+
+
+def _milliseconds(samples):
+    if not samples:
+        return {'p50': None, 'p95': None, 'max': None}
+    ordered = sorted(samples)
+
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1)
+
+    return {'p50': at(50), 'p95': at(95), 'max': round(ordered[-1] * 1000, 1)}
+
+
+class JobExecutor:
+    def __init__(self, app, workers=2, queue_size=100, drain_timeout=10, samples=1000):
+        self.app = app
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._accepting = True
+        self._counters = {'submitted': 0, 'deduplicated': 0, 'ran_inline': 0, 'completed': 0, 'failed': 0}
+        # seconds spent waiting in the queue and running, of the last `samples` jobs
+        self._waits = deque(maxlen=samples)
+        self._runs = deque(maxlen=samples)
+
+    def submit(self, user_id, name, function, *args):
+        # -> False when the same job is already waiting to run
+        key = (user_id, name)
+        with self._lock:
+            self._counters['submitted'] += 1
+            if key in self._pending:
+                self._counters['deduplicated'] += 1
+                return False
+            if self.workers and self._accepting:
+                self._start()
+                # marked pending before it's queued, a worker can't take it until the lock is released
+                self._pending.add(key)
+                try:
+                    self._queue.put_nowait((key, function, args, time.monotonic()))
+                    return True
+                except queue.Full:
+                    self._pending.discard(key)
+            self._counters['ran_inline'] += 1
+        self._run(function, args, time.monotonic(), inline=True)
+        return True
+
+    def _start(self):
+        # threads don't survive a fork, a worker process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._threads = [threading.Thread(target=self._work, name=f'jobs-{n}', daemon=True)
+                         for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                key, function, args, queued_at = job
+                with self._lock:
+                    self._pending.discard(key)
+                self._run(function, args, queued_at)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, function, args, queued_at, inline=False):
+        started = time.monotonic()
+        try:
+            if inline:
+                # already inside the caller's app context and on its session
+                function(*args)
+            else:
+                with self.app.app_context():
+                    function(*args)
+        except Exception:
+            logger.exception('job %s%r failed', function.__name__, args)
+            if inline:
+                db.session.rollback()
+            outcome = 'failed'
+        else:
+            outcome = 'completed'
+        with self._lock:
+            self._counters[outcome] += 1
+            self._waits.append(started - queued_at)
+            self._runs.append(time.monotonic() - started)
+
+    def wait(self):
+        # blocks until everything queued so far has run, for scripts and tests
+        self._queue.join()
+
+    def drain(self, timeout=None):
+        # stop queueing (later submits run inline), let the threads finish what's queued and stop them
+        timeout = self.drain_timeout if timeout is None else timeout
+        with self._lock:
+            self._accepting = False
+            threads = self._threads if self._pid == os.getpid() else []
+        deadline = time.monotonic() + timeout
+        try:
+            for _ in threads:
+                self._queue.put(None, timeout=max(0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        left = sum(1 for job in list(self._queue.queue) if job is not None)
+        if left:
+            logger.warning('%d background jobs dropped after waiting %ss to drain', left, timeout)
+        return left
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                **self._counters,
+                'wait_ms': _milliseconds(self._waits),
+                'run_ms': _milliseconds(self._runs),
+            }
+
+
+def drain_executors(timeout=None):
+    for executor in list(_executors):
+        executor.drain(timeout)
+
+
+def init_jobs(app):
+    executor = JobExecutor(app, workers=app.config['JOBS_WORKERS'], queue_size=app.config['JOBS_QUEUE_SIZE'],
+                           drain_timeout=app.config['JOBS_DRAIN_TIMEOUT'])
+    app.extensions['jobs'] = executor
+    _executors.add(executor)
+
+    @app.route('/job-stats')
+    @admin_required
+    def job_statistics():
+        return jsonify(executor.stats())
@@ -0,0 +1,41 @@
+# applies the versioned migrations in migrations/ to the database
+#   python migrate.py                      -> upgrade to the newest revision
+#   python migrate.py --target 1           -> upgrade up to (and including) revision 1
+#   python migrate.py --list               -> show every migration and whether it has been applied
+# the database comes from --database-url or the DATABASE_URL environment variable. `flask --app server migrate`
+# does the same against the app's configured database
+import argparse
+import os
+
+from sqlalchemy import create_engine
+
+import migrations
+from config import normalize_database_url
+
+
+def database_url(url=None):
+    url = url or os.getenv('DATABASE_URL')
+    if not url:
+        raise SystemExit('no database given, pass --database-url or set DATABASE_URL')
+    return normalize_database_url(url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the StrengthJournal schema migrations')
+    parser.add_argument('--database-url')
+    parser.add_argument('--target', type=int, help='stop after this revision')
+    parser.add_argument('--list', action='store_true', help='list migrations instead of applying them')
+    args = parser.parse_args()
+
+    engine = create_engine(database_url(args.database_url))
+    if args.list:
+        applied = migrations.applied_revisions(engine)
+        for module in migrations.load_migrations():
+            state = 'applied' if module.revision in applied else 'pending'
+            print(f'{module.revision:04d} [{state}] {module.description}')
+        return
+    migrations.upgrade(engine, target=args.target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# a small versioned migration runner. every migration is a module in this package named vNNNN_<name>.py that
+# defines `revision` (int), `description` (str) and `upgrade(connection)`. the revisions that have been applied
+# are recorded in the schema_migrations table so running the upgrade again only picks up the new ones.
+#
+# migrations run inside a transaction unless they set `transactional = False` (e.g. postgres
+# CREATE INDEX CONCURRENTLY can't run in a transaction block), in which case they get an autocommit connection.
+import importlib
+import pkgutil
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+
+def load_migrations():
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if not module_info.name.startswith('v'):
+            continue
+        module = importlib.import_module(f'{__name__}.{module_info.name}')
+        migrations.append(module)
+    migrations.sort(key=lambda module: module.revision)
+    revisions = [module.revision for module in migrations]
+    if len(revisions) != len(set(revisions)):
+        raise RuntimeError(f'duplicate migration revisions: {revisions}')
+    return migrations
+
+
+def ensure_migrations_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text(f'''CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            revision INTEGER PRIMARY KEY,
+            description VARCHAR(250),
+            applied_at TIMESTAMP NOT NULL)'''))
+
+
+def applied_revisions(engine):
+    ensure_migrations_table(engine)
+    with engine.connect() as connection:
+        rows = connection.execute(text(f'SELECT revision FROM {MIGRATIONS_TABLE}')).all()
+    return {revision for revision, in rows}
+
+
+def pending_migrations(engine):
+    applied = applied_revisions(engine)
+    return [module for module in load_migrations() if module.revision not in applied]
+
+
+def _record(connection, module):
+    connection.execute(text(f'INSERT INTO {MIGRATIONS_TABLE} (revision, description, applied_at) '
+                            f'VALUES (:revision, :description, :applied_at)'),
+                       {'revision': module.revision, 'description': module.description,
+                        'applied_at': datetime.utcnow()})
+
+
+def upgrade(engine, target=None, log=print):
+    applied = []
+    for module in pending_migrations(engine):
+        if target is not None and module.revision > target:
+            break
+        log(f'applying migration {module.revision:04d}: {module.description}')
+        if getattr(module, 'transactional', True):
+            with engine.begin() as connection:
+                module.upgrade(connection)
+                _record(connection, module)
+        else:
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                module.upgrade(connection)
+                _record(connection, module)
+        applied.append(module.revision)
+    if not applied:
+        log('database is up to date')
+    return applied
@@ -0,0 +1,32 @@
+# composite indexes for the dashboard lookups. every exercises query filters on user_id + workout (+ exercise) and
+# reads the newest rows first, and every completed_routines query filters on user_id + a date range or a routine.
+# the same indexes are declared on the models so db.create_all() builds them on a fresh database.
+from sqlalchemy import inspect, text
+
+
+revision = 1
+description = 'composite indexes for the exercises and completed_routines lookup paths'
+
+# built outside a transaction so postgres can use CREATE INDEX CONCURRENTLY and not lock the log tables
+transactional = False
+
+INDEXES = [
+    ('ix_exercises_user_workout_exercise_date', 'exercises',
+     'user_id, workout, exercise, date DESC, exercise_id DESC'),
+    ('ix_completed_routines_user_date', 'completed_routines', 'user_id, date'),
+    ('ix_completed_routines_user_workout_date', 'completed_routines', 'user_id, workout, date DESC'),
+]
+
+
+def upgrade(connection):
+    concurrently = 'CONCURRENTLY ' if connection.dialect.name == 'postgresql' else ''
+    for name, table, columns in INDEXES:
+        # a database created after v0008 has these on the name ids already, and postgres checks the columns of a
+        # CREATE INDEX even when IF NOT EXISTS is going to skip it
+        if name in {index['name'] for index in inspect(connection).get_indexes(table)}:
+            continue
+        connection.execute(text(f'CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})'))
+    if connection.dialect.name == 'postgresql':
+        # refresh the planner statistics so the new indexes get picked up straight away
+        connection.execute(text('ANALYZE exercises'))
+        connection.execute(text('ANALYZE completed_routines'))
@@ -0,0 +1,23 @@
+# personal_records holds each user's best set per exercise (see records.py), and is backfilled from the log here.
+# scripts/backfill_personal_records.py runs the same rebuild again if the table ever needs repairing.
+from sqlalchemy import inspect, text
+
+from records import rebuild_all_personal_records
+
+
+revision = 2
+description = 'personal_records table, backfilled from exercises'
+
+
+def upgrade(connection):
+    connection.execute(text('''CREATE TABLE IF NOT EXISTS personal_records (
+        user_id INTEGER NOT NULL,
+        exercise VARCHAR(250) NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        weight FLOAT NOT NULL,
+        reps INTEGER,
+        date DATE NOT NULL,
+        PRIMARY KEY (user_id, exercise))'''))
+    # the rebuild reads the name ids of v0008. a log that still has the names is backfilled by v0008 instead
+    if 'exercise_name_id' in {column['name'] for column in inspect(connection).get_columns('exercises')}:
+        rebuild_all_personal_records(connection)
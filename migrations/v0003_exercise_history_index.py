@@ -0,0 +1,15 @@
+# the user's whole exercise history newest first, which /api/exercises pages through with (date, exercise_id)
+# keyset cursors when no routine or exercise filter narrows it down
+from sqlalchemy import text
+
+
+revision = 3
+description = 'index exercises by user and date for the history api'
+
+transactional = False
+
+
+def upgrade(connection):
+    concurrently = 'CONCURRENTLY ' if connection.dialect.name == 'postgresql' else ''
+    connection.execute(text(f'CREATE INDEX {concurrently}IF NOT EXISTS ix_exercises_user_date '
+                            f'ON exercises (user_id, date DESC, exercise_id DESC)'))
@@ -0,0 +1,20 @@
+# import_jobs tracks the csv history imports batch by batch so a failed import can resume (see importer.py)
+from sqlalchemy import text
+
+
+revision = 4
+description = 'import_jobs table for resumable csv imports'
+
+
+def upgrade(connection):
+    id_column = 'SERIAL PRIMARY KEY' if connection.dialect.name == 'postgresql' else 'INTEGER PRIMARY KEY'
+    connection.execute(text(f'''CREATE TABLE IF NOT EXISTS import_jobs (
+        id {id_column},
+        user_id INTEGER NOT NULL,
+        source VARCHAR(250),
+        batch_size INTEGER NOT NULL,
+        rows_committed INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        error VARCHAR(1000),
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL)'''))
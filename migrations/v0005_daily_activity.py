@@ -0,0 +1,21 @@
+# daily_activity is the per (user, date, workout) rollup of completed_routines the dashboard reads (see activity.py),
+# backfilled here. `flask --app server backfill-daily-activity` runs the same rebuild again if it ever drifts
+from sqlalchemy import inspect, text
+
+from activity import rebuild_all_daily_activity
+
+
+revision = 5
+description = 'daily_activity rollup of completed_routines'
+
+
+def upgrade(connection):
+    connection.execute(text('''CREATE TABLE IF NOT EXISTS daily_activity (
+        user_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        workout VARCHAR(250) NOT NULL,
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date, workout))'''))
+    # the rebuild reads the name ids of v0008. a log that still has the names is backfilled by v0008 instead
+    if 'workout_name_id' in {column['name'] for column in inspect(connection).get_columns('completed_routines')}:
+        rebuild_all_daily_activity(connection)
@@ -0,0 +1,19 @@
+# users.data_version / data_changed_at, the per-user version the dashboards' etags are built from (see
+# conditional.py). db.create_all() on a fresh database already has the columns, so only missing ones are added
+from sqlalchemy import inspect, text
+
+
+revision = 6
+description = 'per-user data version for conditional gets'
+
+COLUMNS = [
+    ('data_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('data_changed_at', 'TIMESTAMP'),
+]
+
+
+def upgrade(connection):
+    existing = {column['name'] for column in inspect(connection).get_columns('user')}
+    for name, definition in COLUMNS:
+        if name not in existing:
+            connection.execute(text(f'ALTER TABLE "user" ADD COLUMN {name} {definition}'))
@@ -0,0 +1,41 @@
+# routine_definitions / routine_exercises (see definitions.py), filled from the exercises log: every workout name
+# the user has rows for becomes a routine, with every exercise logged or templated under it in the order they first
+# appear. the template rows (no date) are then deleted, the log only holds logged sets from here on
+from sqlalchemy import inspect, text
+
+
+revision = 7
+description = 'routine definitions moved out of the exercises log'
+
+
+def upgrade(connection):
+    id_column = 'SERIAL PRIMARY KEY' if connection.dialect.name == 'postgresql' else 'INTEGER PRIMARY KEY'
+    connection.execute(text(f'''CREATE TABLE IF NOT EXISTS routine_definitions (
+        id {id_column},
+        user_id INTEGER NOT NULL,
+        name VARCHAR(250) NOT NULL,
+        CONSTRAINT uq_routine_definitions_user_name UNIQUE (user_id, name))'''))
+    connection.execute(text('''CREATE TABLE IF NOT EXISTS routine_exercises (
+        routine_id INTEGER NOT NULL REFERENCES routine_definitions (id),
+        exercise VARCHAR(250) NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (routine_id, exercise))'''))
+
+    # a database created with the name ids of v0008 has no templates in its log to move
+    if 'workout' not in {column['name'] for column in inspect(connection).get_columns('exercises')}:
+        return
+    connection.execute(text('''
+        INSERT INTO routine_definitions (user_id, name)
+        SELECT DISTINCT user_id, workout FROM exercises WHERE user_id IS NOT NULL AND workout IS NOT NULL
+        ON CONFLICT (user_id, name) DO NOTHING'''))
+    connection.execute(text('''
+        INSERT INTO routine_exercises (routine_id, exercise, position)
+        SELECT routine_definitions.id, exercises.exercise,
+               ROW_NUMBER() OVER (PARTITION BY routine_definitions.id ORDER BY MIN(exercises.exercise_id)) - 1
+        FROM exercises
+        JOIN routine_definitions ON routine_definitions.user_id = exercises.user_id
+                                AND routine_definitions.name = exercises.workout
+        WHERE exercises.exercise IS NOT NULL
+        GROUP BY routine_definitions.id, exercises.exercise
+        ON CONFLICT (routine_id, exercise) DO NOTHING'''))
+    connection.execute(text('DELETE FROM exercises WHERE date IS NULL'))
@@ -0,0 +1,94 @@
+# routine and exercise names move out of the log into workout_names / exercise_names (see names.py): every name a
+# user has in exercises or completed_routines gets an id, the log tables get workout_name_id / exercise_name_id
+# filled from them and lose their name columns, and the indexes on the names are rebuilt on the ids.
+# personal_records and daily_activity are rebuilt keyed on the ids.
+#
+# the UPDATEs rewrite every row of the log, so on postgres the tables only give the space back after a
+# VACUUM FULL (or pg_repack) once this has run. a database created by db.create_all() already has the new columns
+# and only gets the rollups rebuilt.
+from sqlalchemy import inspect, text
+
+from activity import rebuild_all_daily_activity
+from records import rebuild_all_personal_records
+
+
+revision = 8
+description = 'routine and exercise names stored once per user, the log holds their ids'
+
+NAME_TABLES = ['workout_names', 'exercise_names']
+
+# (table, name column, id column, names table)
+NAME_COLUMNS = [
+    ('exercises', 'workout', 'workout_name_id', 'workout_names'),
+    ('exercises', 'exercise', 'exercise_name_id', 'exercise_names'),
+    ('completed_routines', 'workout', 'workout_name_id', 'workout_names'),
+]
+
+# (index, table, columns) that covered the name columns
+INDEXES = [
+    ('ix_exercises_user_workout_exercise_date', 'exercises',
+     'user_id, workout_name_id, exercise_name_id, date DESC, exercise_id DESC'),
+    ('ix_completed_routines_user_workout_date', 'completed_routines', 'user_id, workout_name_id, date DESC'),
+]
+
+
+def upgrade(connection):
+    id_column = 'SERIAL PRIMARY KEY' if connection.dialect.name == 'postgresql' else 'INTEGER PRIMARY KEY'
+    for table in NAME_TABLES:
+        connection.execute(text(f'''CREATE TABLE IF NOT EXISTS {table} (
+            id {id_column},
+            user_id INTEGER NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            CONSTRAINT uq_{table}_user_name UNIQUE (user_id, name))'''))
+
+    columns = {table: {column['name'] for column in inspect(connection).get_columns(table)}
+               for table in ('exercises', 'completed_routines')}
+    converted = []
+    for table, name_column, id_column_name, names_table in NAME_COLUMNS:
+        if name_column not in columns[table]:
+            continue
+        connection.execute(text(f'''
+            INSERT INTO {names_table} (user_id, name)
+            SELECT DISTINCT user_id, {name_column} FROM {table}
+            WHERE user_id IS NOT NULL AND {name_column} IS NOT NULL
+            ON CONFLICT (user_id, name) DO NOTHING'''))
+        if id_column_name not in columns[table]:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {id_column_name} INTEGER '
+                                    f'REFERENCES {names_table} (id)'))
+        connection.execute(text(f'''
+            UPDATE {table} SET {id_column_name} = (
+                SELECT {names_table}.id FROM {names_table}
+                WHERE {names_table}.user_id = {table}.user_id AND {names_table}.name = {table}.{name_column})'''))
+        converted.append((table, name_column))
+
+    # the old indexes include the name columns, which can't be dropped while they're indexed
+    for name, table, index_columns in INDEXES:
+        if table in {converted_table for converted_table, _ in converted}:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    for table, name_column in converted:
+        connection.execute(text(f'ALTER TABLE {table} DROP COLUMN {name_column}'))
+    for name, table, index_columns in INDEXES:
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({index_columns})'))
+
+    # both are rebuilt from the log anyway, they're recreated keyed on the ids
+    connection.execute(text('DROP TABLE IF EXISTS personal_records'))
+    connection.execute(text('''CREATE TABLE personal_records (
+        user_id INTEGER NOT NULL,
+        exercise_name_id INTEGER NOT NULL REFERENCES exercise_names (id),
+        exercise_id INTEGER NOT NULL,
+        weight FLOAT NOT NULL,
+        reps INTEGER,
+        date DATE NOT NULL,
+        PRIMARY KEY (user_id, exercise_name_id))'''))
+    connection.execute(text('DROP TABLE IF EXISTS daily_activity'))
+    connection.execute(text('''CREATE TABLE daily_activity (
+        user_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        workout_name_id INTEGER NOT NULL REFERENCES workout_names (id),
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date, workout_name_id))'''))
+    rebuild_all_personal_records(connection)
+    rebuild_all_daily_activity(connection)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ANALYZE exercises'))
+        connection.execute(text('ANALYZE completed_routines'))
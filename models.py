@@ -0,0 +1,189 @@
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from flask_login import UserMixin
+from flask_marshmallow import Marshmallow
+from sqlalchemy import orm
+
+
+# the bind the read replica's engine is configured under (SQLALCHEMY_BINDS), see replica.py
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(SignallingSession):
+    # while a view under @replica_reads runs, session.info['replica'] is set and every statement the session runs,
+    # orm and raw sql alike, goes to the replica's engine. otherwise it's flask-sqlalchemy's usual choice
+    def get_bind(self, mapper=None, clause=None):
+        if self.info.get(REPLICA_BIND):
+            return db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# the extensions are bound to an app in server.create_app(), nothing here touches the database at import
+db = RoutingSQLAlchemy()
+ma = Marshmallow()
+
+
+# creating the tables
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100), unique=True)
+    password = db.Column(db.String(100))
+    first_name = db.Column(db.String(1000))
+    last_name = db.Column(db.String(1000))
+    # bumped by every write to the user's training data, the pages' etags come from it (see conditional.py)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    data_changed_at = db.Column(db.DateTime, nullable=True)
+
+
+# what flask-login keeps as current_user. a plain copy of the user's public columns, detached from any session, so
+# it can be cached between requests (see load_user in server.py) and the password hash never sits in the cache
+class UserSnapshot(UserMixin):
+    def __init__(self, id, email, first_name, last_name):
+        self.id = id
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.first_name, user.last_name)
+
+
+# each user's routine and exercise names, the log tables hold their ids (see names.py). kept in sync with
+# migrations/v0008_name_ids.py
+class WorkoutNames(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(250), nullable=False)
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_workout_names_user_name'),)
+
+
+class ExerciseNames(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(250), nullable=False)
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_exercise_names_user_name'),)
+
+
+class Exercises(db.Model):
+    exercise_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    date = db.Column(db.Date, nullable=True)
+    workout_name_id = db.Column(db.Integer, db.ForeignKey('workout_names.id'))
+    exercise_name_id = db.Column(db.Integer, db.ForeignKey('exercise_names.id'))
+    sets = db.Column(db.Integer, nullable=True)
+    reps = db.Column(db.Integer, nullable=True)
+    weight = db.Column(db.Float)
+    # the names, for the api's schemas
+    workout = db.column_property(db.select(WorkoutNames.name).where(WorkoutNames.id == workout_name_id)
+                                 .scalar_subquery())
+    exercise = db.column_property(db.select(ExerciseNames.name).where(ExerciseNames.id == exercise_name_id)
+                                  .scalar_subquery())
+
+
+# every exercises lookup filters on the user + routine (+ exercise) and reads the newest rows first, so the index is
+# ordered the same way the dashboards sort. kept in sync with migrations/v0001_hot_path_indexes.py and v0008
+db.Index('ix_exercises_user_workout_exercise_date', Exercises.user_id, Exercises.workout_name_id,
+         Exercises.exercise_name_id, Exercises.date.desc(), Exercises.exercise_id.desc())
+# the whole history newest first, for the keyset pages of /api/exercises. kept in sync with migrations/v0003
+db.Index('ix_exercises_user_date', Exercises.user_id, Exercises.date.desc(), Exercises.exercise_id.desc())
+
+
+# the routines a user has set up and their exercises in order, apart from the log (see definitions.py). kept in sync
+# with migrations/v0007_routine_definitions.py
+class RoutineDefinitions(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(250), nullable=False)
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_routine_definitions_user_name'),)
+
+
+class RoutineExercises(db.Model):
+    routine_id = db.Column(db.Integer, db.ForeignKey('routine_definitions.id'), primary_key=True,
+                           autoincrement=False)
+    exercise = db.Column(db.String(250), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+
+
+# the exercises of the routine being created or edited, exercise name in `workout` (see STAGED_EXERCISES)
+class Routines(db.Model):
+    routine_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    workout = db.Column(db.String(250), nullable=False)
+    routine_name = db.Column(db.String(250))
+
+
+class CompletedRoutines(db.Model):
+    routine_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    date = db.Column(db.Date, nullable=False)
+    workout_name_id = db.Column(db.Integer, db.ForeignKey('workout_names.id'))
+    workout = db.column_property(db.select(WorkoutNames.name).where(WorkoutNames.id == workout_name_id)
+                                 .scalar_subquery())
+
+
+# the 30 day cards filter completed_routines by user + date range, the routine dashboard by user + routine + date
+db.Index('ix_completed_routines_user_date', CompletedRoutines.user_id, CompletedRoutines.date)
+db.Index('ix_completed_routines_user_workout_date', CompletedRoutines.user_id, CompletedRoutines.workout_name_id,
+         CompletedRoutines.date.desc())
+
+
+# each user's best set per exercise, maintained by records.py as workouts are logged, deleted and renamed
+class PersonalRecords(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    exercise_name_id = db.Column(db.Integer, db.ForeignKey('exercise_names.id'), primary_key=True,
+                                 autoincrement=False)
+    exercise_id = db.Column(db.Integer, nullable=False)
+    weight = db.Column(db.Float, nullable=False)
+    reps = db.Column(db.Integer, nullable=True)
+    date = db.Column(db.Date, nullable=False)
+
+
+# how many times each routine was completed per user and day, maintained by activity.py from completed_routines.
+# the dashboard reads its windowed figures from here
+class DailyActivity(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.Date, primary_key=True)
+    workout_name_id = db.Column(db.Integer, db.ForeignKey('workout_names.id'), primary_key=True,
+                                autoincrement=False)
+    sessions = db.Column(db.Integer, nullable=False)
+
+
+# progress of a csv history import (see importer.py). rows_committed is how far a failed import got, so it can resume
+class ImportJobs(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    source = db.Column(db.String(250))
+    batch_size = db.Column(db.Integer, nullable=False)
+    rows_committed = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False)
+    error = db.Column(db.String(1000))
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class ExercisesSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Exercises
+        load_instance = True
+        exclude = ('workout_name_id', 'exercise_name_id')
+
+class UserSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = User
+        load_instance = True
+
+class RoutinesSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Routines
+        load_instance = True
+
+class CompletedRoutinesSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = CompletedRoutines
+        load_instance = True
+        exclude = ('workout_name_id',)
@@ -0,0 +1,99 @@
+# the per-user dictionaries of workout (routine) and exercise names. the exercises log, completed_routines and the
+# tables built from them (personal_records, daily_activity) store a name's integer id instead of repeating the
+# string on every row, so their rows and indexes are a fraction of the size and every filter, group and join on a
+# routine or exercise compares integers. names only come back as strings where they're shown, joined in by id.
+#
+# a name keeps its id for good: rows are only ever added to workout_names / exercise_names, renaming a routine
+# points its rows at the new name's id and deleting one leaves the name behind. so a (user, name) <-> id pair read
+# from the database never goes stale, and every process keeps the ones it has seen in the NAME_CACHE_SIZE LRU the
+# app holds in app.extensions['name_cache']. resolving the routine and exercise of a request is a dict lookup, one
+# query for a name the process hasn't seen yet.
+#
+# names are created on the connection or session the caller passes in, inside its transaction, and may still be
+# rolled back with it. so a lookup that is allowed to create names (create=True) doesn't fill the cache, the ids get
+# cached the next time they are read.
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, text
+
+from cache import MISSING
+
+
+WORKOUT_NAMES = 'workout_names'
+EXERCISE_NAMES = 'exercise_names'
+
+_CREATE_SQL = {table: text(f'INSERT INTO {table} (user_id, name) VALUES (:user_id, :name) '
+                           f'ON CONFLICT (user_id, name) DO NOTHING')
+               for table in (WORKOUT_NAMES, EXERCISE_NAMES)}
+_IDS_SQL = {table: text(f'SELECT name, id FROM {table} WHERE user_id = :user_id AND name IN :names').bindparams(
+    bindparam('names', expanding=True)) for table in (WORKOUT_NAMES, EXERCISE_NAMES)}
+_NAMES_SQL = {table: text(f'SELECT id, name FROM {table} WHERE user_id = :user_id AND id IN :ids').bindparams(
+    bindparam('ids', expanding=True)) for table in (WORKOUT_NAMES, EXERCISE_NAMES)}
+
+
+def _cache():
+    if has_app_context():
+        return current_app.extensions.get('name_cache')
+    return None
+
+
+def _remember(cache, table, user_id, name, name_id):
+    cache.set(f'{user_id}:{table}:name:{name}', name_id)
+    cache.set(f'{user_id}:{table}:id:{name_id}', name)
+
+
+def name_ids(connection, table, user_id, names, create=False):
+    # -> {'Squat': 3, ...} for the names the user has, or all of them with create=True
+    names = [name for name in dict.fromkeys(names) if name is not None]
+    cache = _cache()
+    ids = {}
+    missing = []
+    for name in names:
+        found = cache.get(f'{user_id}:{table}:name:{name}') if cache is not None else MISSING
+        if found is MISSING:
+            missing.append(name)
+        else:
+            ids[name] = found
+    if not missing:
+        return ids
+    if create:
+        connection.execute(_CREATE_SQL[table], [{'user_id': user_id, 'name': name} for name in missing])
+    for name, name_id in connection.execute(_IDS_SQL[table], {'user_id': user_id, 'names': missing}):
+        ids[name] = name_id
+        if cache is not None and not create:
+            _remember(cache, table, user_id, name, name_id)
+    return ids
+
+
+def name_id(connection, table, user_id, name, create=False):
+    # -> the name's id, None when the user has no such name (or name is None)
+    return name_ids(connection, table, user_id, [name], create).get(name)
+
+
+def id_names(connection, table, user_id, ids):
+    # the other way round -> {3: 'Squat', ...}
+    ids = [name_id for name_id in dict.fromkeys(ids) if name_id is not None]
+    cache = _cache()
+    names = {}
+    missing = []
+    for name_id in ids:
+        found = cache.get(f'{user_id}:{table}:id:{name_id}') if cache is not None else MISSING
+        if found is MISSING:
+            missing.append(name_id)
+        else:
+            names[name_id] = found
+    if missing:
+        for name_id, name in connection.execute(_NAMES_SQL[table], {'user_id': user_id, 'ids': missing}):
+            names[name_id] = name
+            if cache is not None:
+                _remember(cache, table, user_id, name, name_id)
+    return names
+
+
+def encode_exercise_rows(connection, user_id, rows):
+    # exercises rows carrying 'workout' and 'exercise' names (a submitted form, a csv batch) -> the rows the table
+    # takes, with workout_name_id / exercise_name_id. names the user doesn't have yet are created
+    workout_ids = name_ids(connection, WORKOUT_NAMES, user_id, [row['workout'] for row in rows], create=True)
+    exercise_ids = name_ids(connection, EXERCISE_NAMES, user_id, [row['exercise'] for row in rows], create=True)
+    return [{'user_id': row['user_id'], 'date': row['date'], 'workout_name_id': workout_ids.get(row['workout']),
+             'exercise_name_id': exercise_ids.get(row['exercise']), 'sets': row['sets'], 'reps': row['reps'],
+             'weight': row['weight']} for row in rows]
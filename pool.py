@@ -0,0 +1,137 @@
+# the app's connection pools. every query, orm and raw sql alike, goes through flask-sqlalchemy's engine (or the read
+# replica's, see replica.py, which gets a pool of the same size), and the sizing comes from config so it can be
+# matched against postgres max_connections on each server:
+#   workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) <= max_connections (minus whatever else connects)
+# on a sqlite file (the embedded mode) each worker keeps a single connection instead, see sqlite_engine_options().
+# gunicorn.conf.py resets the pools after a fork and logs the totals when the master is ready. GET /pool-stats shows
+# the current numbers, for ADMIN_EMAILS only (admin.py).
+import logging
+import os
+import sqlite3
+import time
+import weakref
+
+from flask import jsonify
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from admin import admin_required
+from models import REPLICA_BIND, db
+
+
+logger = logging.getLogger('strengthjournal.pool')
+
+# every app built in this process, so the gunicorn hooks can reach their engines
+_apps = weakref.WeakSet()
+
+
+def engine_options(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return sqlite_engine_options(config)
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def sqlite_connection_class(config):
+    # a sqlite3 connection that sets the embedded mode's pragmas as soon as it's opened. the database path isn't
+    # part of it, so a sqlite replica bind (replica.py) gets the same treatment
+    pragmas = [f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+               f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+               f"PRAGMA mmap_size = {config['SQLITE_MMAP_SIZE']}"]
+
+    class TunedConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for pragma in pragmas:
+                self.execute(pragma)
+
+    return TunedConnection
+
+
+def sqlite_engine_options(config):
+    # the embedded mode, DATABASE_URL=sqlite:///workout_log.db: no server and no network hop. every worker keeps
+    # one connection open for good (sqlalchemy would otherwise open a new one, and lose its page cache, on every
+    # checkout) and only opens more while the background jobs need them at the same time. wal lets the readers go
+    # on while one writer commits, synchronous=normal only syncs at checkpoints (a power cut can lose the last
+    # commits, never corrupt the file) and mmap reads the file without copying it through read() calls.
+    # an in-memory database keeps flask-sqlalchemy's single shared connection
+    database = make_url(config['SQLALCHEMY_DATABASE_URI']).database
+    if database in (None, '', ':memory:'):
+        return {}
+    return {
+        'poolclass': QueuePool,
+        'pool_size': 1,
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        # the pooled connection moves between the request and job threads, one at a time
+        'connect_args': {'check_same_thread': False, 'timeout': config['SQLITE_BUSY_TIMEOUT'],
+                         'factory': sqlite_connection_class(config)},
+    }
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pid': os.getpid(), 'pool': type(pool).__name__, 'status': pool.status()}
+    # only QueuePool keeps counters, an in-memory sqlite database's pool doesn't
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        counter = getattr(pool, name, None)
+        if counter is not None:
+            stats[name] = counter()
+    return stats
+
+
+def replica_engine(app):
+    # None when the app has no read replica
+    if REPLICA_BIND not in (app.config['SQLALCHEMY_BINDS'] or {}):
+        return None
+    return db.get_engine(app, bind=REPLICA_BIND)
+
+
+def app_engines(app):
+    engines = [db.get_engine(app)]
+    replica = replica_engine(app)
+    if replica is not None:
+        engines.append(replica)
+    return engines
+
+
+def all_pool_stats(app):
+    stats = pool_stats(db.get_engine(app))
+    replica = replica_engine(app)
+    if replica is not None:
+        stats['replica'] = pool_stats(replica)
+    return stats
+
+
+def dispose_engines(close=False):
+    # after a fork the child must not reuse the parent's connections. close=False just forgets them (the parent
+    # still owns the sockets), close=True closes them properly when a worker shuts down
+    for app in list(_apps):
+        with app.app_context():
+            for engine in app_engines(app):
+                engine.dispose(close=close)
+
+
+def init_pool(app):
+    _apps.add(app)
+    interval = app.config['POOL_STATS_LOG_INTERVAL']
+    last_logged = [0.0]
+
+    if interval:
+        @app.after_request
+        def log_pool_stats(response):
+            now = time.monotonic()
+            if now - last_logged[0] >= interval:
+                last_logged[0] = now
+                logger.info('pool stats %s', all_pool_stats(app))
+            return response
+
+    @app.route('/pool-stats')
+    @admin_required
+    def pool_statistics():
+        return jsonify(all_pool_stats(app))
@@ -0,0 +1,345 @@
+# every statement the views run, declared once at import with bound parameters. the sql text never changes
+# between requests, only the parameters do, so sqlalchemy compiles each statement once per process (its compiled
+# cache is keyed on the statement) and postgres sees the same few statements over and over. user input never
+# becomes part of the sql, so routine and exercise names with quotes in them are just values.
+#
+# the log tables hold routine and exercise names as ids (see names.py). statements filter on
+# :workout_name_id / :exercise_name_id, which the callers resolve through the name cache, and join the names back
+# in only for what they return.
+#
+# run them with fetch() (rows) or execute() (writes) on db.session, so they're part of the request's transaction.
+# with PREPARED_STATEMENTS on (postgres only) each statement is PREPAREd once per database connection and run with
+# EXECUTE after that, which skips parsing and planning on the server too. leave it off behind a pgbouncer in
+# transaction mode, prepared statements belong to a server connection and pgbouncer hands those out per transaction.
+#
+# the same statements run on postgres and on a sqlite file (the embedded mode, see pool.py). they stick to sql both
+# understand, and where the two differ the difference is a @compiles function with a sqlite variant (day_number).
+import re
+
+from flask import current_app, has_app_context
+from sqlalchemy import Date, Integer, bindparam, exists, func, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from models import (CompletedRoutines, ExerciseNames, Exercises, RoutineDefinitions, RoutineExercises, Routines, User,
+                    WorkoutNames)
+
+
+class Statement:
+    # a sql statement and the name its server-side prepared statement goes by. statements with an expanding
+    # parameter (IN lists) can't be prepared, their sql depends on the number of values
+    def __init__(self, name, clause, preparable=True):
+        self.name = name
+        self.clause = clause
+        self.preparable = preparable
+        self._prepared = {}
+
+    def prepared_sql(self, dialect):
+        # the compiled sql with every %(name)s turned into $1, $2... -> (sql, parameter names in $ order, defaults)
+        if dialect.name not in self._prepared:
+            compiled = self.clause.compile(dialect=dialect)
+            names = []
+
+            def placeholder(match):
+                if match.group(1) not in names:
+                    names.append(match.group(1))
+                return f'${names.index(match.group(1)) + 1}'
+
+            sql = re.sub(r'%\((\w+)\)s', placeholder, compiled.string).replace('%%', '%')
+            self._prepared[dialect.name] = (sql, names, compiled.params)
+        return self._prepared[dialect.name]
+
+
+class day_number(FunctionElement):
+    # whole days since 1970-01-01, so dates can be bucketed with integer arithmetic on any database
+    type = Integer()
+    name = 'day_number'
+    inherit_cache = True
+
+
+@compiles(day_number)
+def _day_number(element, compiler, **kw):
+    return f"(CAST({compiler.process(element.clauses, **kw)} AS DATE) - DATE '1970-01-01')"
+
+
+@compiles(day_number, 'sqlite')
+def _sqlite_day_number(element, compiler, **kw):
+    # julianday('1970-01-01') is 2440587.5
+    return f"CAST(julianday({compiler.process(element.clauses, **kw)}) - 2440587.5 AS INTEGER)"
+
+
+exercises = Exercises.__table__
+completed_routines = CompletedRoutines.__table__
+routines = Routines.__table__
+routine_definitions = RoutineDefinitions.__table__
+routine_exercises = RoutineExercises.__table__
+users = User.__table__
+workout_names = WorkoutNames.__table__
+exercise_names = ExerciseNames.__table__
+
+
+# every figure on /dashboard in a single round trip, read from the daily_activity rollup (see activity.py) rather
+# than the raw completed_routines log. each branch of the UNION is tagged with the figure it feeds:
+#   routine  -> the user's routine names for the dropdown, the ones with logged sets (one index probe per name)
+#   pie      -> how many of the last 10 completed routines were each routine (ordered by most recent). the last 10
+#               sessions are spread over at most the 10 newest rollup rows, the running total trims the oldest one
+#   days     -> unique number of days worked out between :since and :until
+#   routines -> unique number of routines done in the window
+#   favorite -> the routine done most often in the window
+# the window is at most one row per routine per day, so a year costs about what a week does
+DASHBOARD_FIGURES = Statement('dashboard_figures', text('''
+WITH in_window AS (
+    SELECT date, workout_name_id, sessions FROM daily_activity
+    WHERE user_id = :user_id AND date >= :since AND date <= :until
+), newest AS (
+    SELECT daily_activity.date, workout_names.name AS workout, daily_activity.sessions
+    FROM daily_activity JOIN workout_names ON workout_names.id = daily_activity.workout_name_id
+    WHERE daily_activity.user_id = :user_id
+    ORDER BY daily_activity.date DESC, workout_names.name LIMIT 10
+), last_ten AS (
+    SELECT date, workout, sessions,
+           SUM(sessions) OVER (ORDER BY date DESC, workout ROWS UNBOUNDED PRECEDING) AS running
+    FROM newest
+), favorite AS (
+    SELECT workout_name_id, SUM(sessions) AS sessions FROM in_window
+    GROUP BY workout_name_id ORDER BY SUM(sessions) DESC, max(date) DESC LIMIT 1
+)
+SELECT 'routine' AS figure, name AS label, CAST(NULL AS BIGINT) AS value, CAST(NULL AS DATE) AS ordering
+    FROM workout_names WHERE user_id = :user_id AND EXISTS (
+        SELECT 1 FROM exercises WHERE exercises.user_id = :user_id AND exercises.workout_name_id = workout_names.id)
+UNION ALL
+SELECT 'pie', workout,
+       CAST(SUM(CASE WHEN running > 10 THEN 10 - (running - sessions) ELSE sessions END) AS BIGINT), max(date)
+    FROM last_ten WHERE running - sessions < 10 GROUP BY workout
+UNION ALL
+SELECT 'days', NULL, count(DISTINCT date), NULL FROM in_window
+UNION ALL
+SELECT 'routines', NULL, count(DISTINCT workout_name_id), NULL FROM in_window
+UNION ALL
+SELECT 'favorite', workout_names.name, CAST(favorite.sessions AS BIGINT), CAST(NULL AS DATE)
+    FROM favorite JOIN workout_names ON workout_names.id = favorite.workout_name_id
+'''))
+
+# the dates of the last :limit times the user completed the routine, newest first
+LAST_ROUTINE_DATES = Statement('last_routine_dates', select(completed_routines.c.date).where(
+    completed_routines.c.user_id == bindparam('user_id'),
+    completed_routines.c.workout_name_id == bindparam('workout_name_id'),
+    completed_routines.c.date.isnot(None)
+).order_by(completed_routines.c.date.desc()).limit(bindparam('limit', type_=Integer)))
+
+
+def _routine_series(*conditions):
+    # the last :limit logged (exercise, date, weight) rows of every exercise in the routine, grouped by exercise
+    # and oldest first within each
+    position = func.row_number().over(
+        partition_by=exercises.c.exercise_name_id,
+        order_by=(exercises.c.date.desc(), exercises.c.exercise_id.desc())
+    ).label('position')
+    ranked = select(exercises.c.exercise_name_id, exercises.c.date, exercises.c.weight, position).where(
+        exercises.c.user_id == bindparam('user_id'),
+        exercises.c.workout_name_id == bindparam('workout_name_id'),
+        exercises.c.date.isnot(None),
+        *conditions
+    ).subquery()
+    return select(exercise_names.c.name.label('exercise'), ranked.c.date, ranked.c.weight).join_from(
+        ranked, exercise_names, exercise_names.c.id == ranked.c.exercise_name_id
+    ).where(
+        ranked.c.position <= bindparam('limit', type_=Integer)
+    ).order_by(exercise_names.c.name, ranked.c.position.desc())
+
+
+ROUTINE_SERIES = Statement('routine_series', _routine_series())
+# one exercise of the routine, only the sessions it had a weight recorded
+EXERCISE_SERIES = Statement('exercise_series', _routine_series(
+    exercises.c.exercise_name_id == bindparam('exercise_name_id'),
+    exercises.c.weight.isnot(None)
+))
+
+# the first day the user completed the routine, where an all-time chart starts
+FIRST_ROUTINE_DATE = Statement('first_routine_date', select(func.min(completed_routines.c.date)).where(
+    completed_routines.c.user_id == bindparam('user_id'),
+    completed_routines.c.workout_name_id == bindparam('workout_name_id')
+))
+
+
+def _bucketed_series():
+    # the heaviest weight of every exercise in the routine per :width day bucket from :since to :until. bucket 0
+    # starts on :since, so there are at most (until - since) / width + 1 buckets whatever the history holds
+    bucket = ((day_number(exercises.c.date) - day_number(bindparam('since', type_=Date)))
+              / bindparam('width', type_=Integer)).label('bucket')
+    sets = select(exercises.c.exercise_name_id, bucket, exercises.c.weight).where(
+        exercises.c.user_id == bindparam('user_id'),
+        exercises.c.workout_name_id == bindparam('workout_name_id'),
+        exercises.c.date >= bindparam('since', type_=Date),
+        exercises.c.date <= bindparam('until', type_=Date),
+        exercises.c.weight.isnot(None)
+    ).subquery()
+    buckets = select(sets.c.exercise_name_id, sets.c.bucket, func.max(sets.c.weight).label('weight')).group_by(
+        sets.c.exercise_name_id, sets.c.bucket
+    ).subquery()
+    return select(exercise_names.c.name.label('exercise'), buckets.c.bucket, buckets.c.weight).join_from(
+        buckets, exercise_names, exercise_names.c.id == buckets.c.exercise_name_id
+    ).order_by(exercise_names.c.name, buckets.c.bucket)
+
+
+BUCKETED_SERIES = Statement('bucketed_series', _bucketed_series())
+
+# every logged weight of one exercise of the routine from :since to :until, oldest first
+EXERCISE_HISTORY = Statement('exercise_history', select(exercises.c.date, exercises.c.weight).where(
+    exercises.c.user_id == bindparam('user_id'),
+    exercises.c.workout_name_id == bindparam('workout_name_id'),
+    exercises.c.exercise_name_id == bindparam('exercise_name_id'),
+    exercises.c.date >= bindparam('since', type_=Date),
+    exercises.c.date <= bindparam('until', type_=Date),
+    exercises.c.weight.isnot(None)
+).order_by(exercises.c.date, exercises.c.exercise_id))
+
+# the user's data version and when it last changed, read before a conditional get renders anything. every write
+# bumps it in its own transaction
+DATA_VERSION = Statement('data_version', select(users.c.data_version, users.c.data_changed_at).where(
+    users.c.id == bindparam('user_id')
+))
+BUMP_DATA_VERSION = Statement('bump_data_version', text(
+    'UPDATE "user" SET data_version = data_version + 1, data_changed_at = :changed_at WHERE id = :user_id'
+))
+
+# every logged set with a weight, the input of analytics.py. one exercise, or all of them
+# the date comes back as a day number, which numpy takes as datetime64[D] without parsing a date object per row
+_SET_COLUMNS = (exercises.c.exercise_name_id, day_number(exercises.c.date).label('day'), exercises.c.sets,
+                exercises.c.reps, exercises.c.weight)
+USER_SETS = Statement('user_sets', select(*_SET_COLUMNS).where(
+    exercises.c.user_id == bindparam('user_id'),
+    exercises.c.exercise_name_id.isnot(None),
+    exercises.c.date.isnot(None),
+    exercises.c.weight.isnot(None)
+))
+EXERCISE_SETS = Statement('exercise_sets', select(*_SET_COLUMNS).where(
+    exercises.c.user_id == bindparam('user_id'),
+    exercises.c.exercise_name_id == bindparam('exercise_name_id'),
+    exercises.c.date.isnot(None),
+    exercises.c.weight.isnot(None)
+))
+
+# the exercises the user has logged for the routine, one index probe per exercise name of the user
+LOGGED_ROUTINE_EXERCISES = Statement('logged_routine_exercises', select(exercise_names.c.name).where(
+    exercise_names.c.user_id == bindparam('user_id'),
+    exists().where(
+        exercises.c.user_id == bindparam('user_id'),
+        exercises.c.workout_name_id == bindparam('workout_name_id'),
+        exercises.c.exercise_name_id == exercise_names.c.id,
+        exercises.c.date.isnot(None)
+    )
+).order_by(exercise_names.c.name))
+
+# the exercises of the routine in order, from its definition (see definitions.py)
+ROUTINE_EXERCISES = Statement('routine_exercises', select(routine_exercises.c.exercise).select_from(
+    routine_exercises.join(routine_definitions, routine_definitions.c.id == routine_exercises.c.routine_id)
+).where(
+    routine_definitions.c.user_id == bindparam('user_id'),
+    routine_definitions.c.name == bindparam('routine')
+).order_by(routine_exercises.c.position))
+
+# the routines the user has set up, for the workout picker
+ROUTINE_NAMES = Statement('routine_names', select(routine_definitions.c.name).where(
+    routine_definitions.c.user_id == bindparam('user_id')
+).order_by(routine_definitions.c.name))
+
+# the routines the user has completed at least once, for the routine dashboard dropdown
+COMPLETED_ROUTINE_NAMES = Statement('completed_routine_names', select(workout_names.c.name).where(
+    workout_names.c.user_id == bindparam('user_id'),
+    exists().where(
+        completed_routines.c.user_id == bindparam('user_id'),
+        completed_routines.c.workout_name_id == workout_names.c.id
+    )
+).order_by(workout_names.c.name))
+
+ROUTINE_NAME_TAKEN = Statement('routine_name_taken', select(routine_definitions.c.id).where(
+    routine_definitions.c.user_id == bindparam('user_id'),
+    routine_definitions.c.name == bindparam('routine')
+))
+
+# removes the routine's logged sets with one DELETE scoped to the user
+DELETE_ROUTINE = Statement('delete_routine', exercises.delete().where(
+    exercises.c.user_id == bindparam('user_id'),
+    exercises.c.workout_name_id == bindparam('workout_name_id')
+))
+
+# a deleted or renamed routine takes its completed sessions along
+DELETE_COMPLETED_ROUTINE = Statement('delete_completed_routine', completed_routines.delete().where(
+    completed_routines.c.user_id == bindparam('user_id'),
+    completed_routines.c.workout_name_id == bindparam('workout_name_id')
+))
+
+RENAME_COMPLETED_ROUTINE = Statement('rename_completed_routine', text(
+    'UPDATE completed_routines SET workout_name_id = :new_workout_name_id '
+    'WHERE user_id = :user_id AND workout_name_id = :workout_name_id'
+))
+
+# the two halves of saving an edited routine's log: drop the exercises that were taken out, move the rest to the
+# new name
+DELETE_DROPPED_EXERCISES = Statement('delete_dropped_exercises', exercises.delete().where(
+    exercises.c.user_id == bindparam('user_id'),
+    exercises.c.workout_name_id == bindparam('workout_name_id'),
+    exercises.c.exercise_name_id.notin_(bindparam('keep', expanding=True))
+), preparable=False)
+
+RENAME_ROUTINE = Statement('rename_routine', text(
+    'UPDATE exercises SET workout_name_id = :new_workout_name_id '
+    'WHERE user_id = :user_id AND workout_name_id = :workout_name_id'
+))
+
+# the routines table holds the exercises of the routine being created or edited (exercise name in `workout`)
+STAGED_EXERCISES = Statement('staged_exercises', select(routines.c.workout).distinct().where(
+    routines.c.user_id == bindparam('user_id')
+))
+
+NAME_STAGED_EXERCISES = Statement('name_staged_exercises', text(
+    'UPDATE routines SET routine_name = :routine WHERE user_id = :user_id'
+))
+
+CLEAR_STAGED_EXERCISES = Statement('clear_staged_exercises', routines.delete().where(
+    routines.c.user_id == bindparam('user_id')
+))
+
+DELETE_STAGED_EXERCISE = Statement('delete_staged_exercise', routines.delete().where(
+    routines.c.user_id == bindparam('user_id'),
+    routines.c.workout == bindparam('exercise')
+))
+
+
+def _use_prepared(connection, statement):
+    return (statement.preparable and connection.dialect.name == 'postgresql' and has_app_context()
+            and current_app.config.get('PREPARED_STATEMENTS'))
+
+
+def _execute_prepared(connection, statement, params):
+    sql, names, defaults = statement.prepared_sql(connection.dialect)
+    # prepared statements live as long as the database connection, connection.info goes with it
+    prepared = connection.info.setdefault('prepared_statements', set())
+    if statement.name not in prepared:
+        connection.exec_driver_sql(f'PREPARE {statement.name} AS {sql}')
+        prepared.add(statement.name)
+    arguments = ', '.join(f'%({name})s' for name in names)
+    return connection.exec_driver_sql(f'EXECUTE {statement.name}({arguments})' if names else
+                                      f'EXECUTE {statement.name}', {**defaults, **params})
+
+
+def _execute(session, statement, params):
+    connection = session.connection()
+    if _use_prepared(connection, statement):
+        return _execute_prepared(connection, statement, params)
+    return connection.execute(statement.clause, params)
+
+
+def fetch(session, statement, **params):
+    return _execute(session, statement, params).all()
+
+
+def fetch_column(session, statement, **params):
+    # the first column of every row -> ['Leg Day', 'Push']
+    return [row[0] for row in _execute(session, statement, params)]
+
+
+def execute(session, statement, **params):
+    # for writes, returns the number of rows affected
+    return _execute(session, statement, params).rowcount
@@ -0,0 +1,87 @@
+# keeps the personal_records table in step with the exercises log. there is one row per (user, exercise) holding
+# the user's best set for that exercise: the heaviest weight, then the most reps, then the earliest date it was
+# done. logging a workout only compares the new sets against the stored record, and deleting or renaming rows
+# rebuilds the user's records from the log, so reading a record never has to sort the user's whole history.
+#
+# every function takes anything with an .execute(text, params) (the flask-sqlalchemy session or a connection)
+# and runs in the caller's transaction.
+from sqlalchemy import bindparam, text
+
+from names import EXERCISE_NAMES, name_ids
+
+
+# best logged set of every (user, exercise) that matches the conditions. reps that weren't recorded rank last
+_RANKED_SETS_SQL = '''
+SELECT user_id, exercise_name_id, exercise_id, weight, reps, date FROM (
+    SELECT user_id, exercise_name_id, exercise_id, weight, reps, date,
+           ROW_NUMBER() OVER (
+               PARTITION BY user_id, exercise_name_id
+               ORDER BY weight DESC, CASE WHEN reps IS NULL THEN 1 ELSE 0 END, reps DESC, date, exercise_id
+           ) AS position
+    FROM exercises
+    WHERE date IS NOT NULL AND weight IS NOT NULL AND exercise_name_id IS NOT NULL {conditions}
+) AS ranked_sets
+WHERE position = 1
+'''
+
+_UPSERT_RECORDS_SQL = '''
+INSERT INTO personal_records (user_id, exercise_name_id, exercise_id, weight, reps, date)
+{ranked_sets}
+ON CONFLICT (user_id, exercise_name_id) DO UPDATE SET
+    exercise_id = excluded.exercise_id, weight = excluded.weight, reps = excluded.reps, date = excluded.date
+WHERE excluded.weight > personal_records.weight
+   OR (excluded.weight = personal_records.weight
+       AND COALESCE(excluded.reps, -1) > COALESCE(personal_records.reps, -1))
+   OR (excluded.weight = personal_records.weight
+       AND COALESCE(excluded.reps, -1) = COALESCE(personal_records.reps, -1)
+       AND (excluded.date < personal_records.date
+            OR (excluded.date = personal_records.date AND excluded.exercise_id < personal_records.exercise_id)))
+'''
+
+RECORD_SESSION_SQL = text(_UPSERT_RECORDS_SQL.format(ranked_sets=_RANKED_SETS_SQL.format(
+    conditions='AND user_id = :user_id AND workout_name_id = :workout_name_id AND date = :date')))
+
+DELETE_USER_RECORDS_SQL = text('DELETE FROM personal_records WHERE user_id = :user_id')
+REBUILD_USER_RECORDS_SQL = text('INSERT INTO personal_records '
+                                '(user_id, exercise_name_id, exercise_id, weight, reps, date) '
+                                + _RANKED_SETS_SQL.format(conditions='AND user_id = :user_id'))
+
+DELETE_ALL_RECORDS_SQL = text('DELETE FROM personal_records')
+REBUILD_ALL_RECORDS_SQL = text('INSERT INTO personal_records '
+                               '(user_id, exercise_name_id, exercise_id, weight, reps, date) '
+                               + _RANKED_SETS_SQL.format(conditions=''))
+
+PERSONAL_RECORDS_SQL = text('''
+SELECT personal_records.exercise_id, exercise_names.name AS exercise, personal_records.weight, personal_records.reps,
+       personal_records.date
+FROM personal_records JOIN exercise_names ON exercise_names.id = personal_records.exercise_name_id
+WHERE personal_records.user_id = :user_id AND personal_records.exercise_name_id IN :exercise_name_ids
+ORDER BY exercise_names.name
+''').bindparams(bindparam('exercise_name_ids', expanding=True))
+
+
+def record_logged_session(connection, user_id, workout_name_id, session_date):
+    # called after a workout's exercises are inserted. only that session's sets are ranked and each one replaces
+    # the stored record if it beats it
+    connection.execute(RECORD_SESSION_SQL, {'user_id': user_id, 'workout_name_id': workout_name_id,
+                                            'date': session_date})
+
+
+def rebuild_personal_records(connection, user_id):
+    # called after the user's exercises were deleted or moved, when a record may point at a row that's gone
+    connection.execute(DELETE_USER_RECORDS_SQL, {'user_id': user_id})
+    connection.execute(REBUILD_USER_RECORDS_SQL, {'user_id': user_id})
+
+
+def rebuild_all_personal_records(connection):
+    connection.execute(DELETE_ALL_RECORDS_SQL)
+    connection.execute(REBUILD_ALL_RECORDS_SQL)
+
+
+def personal_records(connection, user_id, exercises):
+    # the user's records for the given exercises as (exercise_id, exercise, weight, reps, date) tuples
+    exercise_name_ids = list(name_ids(connection, EXERCISE_NAMES, user_id, exercises).values())
+    if not exercise_name_ids:
+        return []
+    rows = connection.execute(PERSONAL_RECORDS_SQL, {'user_id': user_id, 'exercise_name_ids': exercise_name_ids})
+    return [tuple(row) for row in rows]
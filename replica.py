@@ -0,0 +1,54 @@
+# read replica routing for the analytics pages. with REPLICA_DATABASE_URL set the app gets a second engine (the
+# 'replica' bind, see models.RoutingSession) and the views under @replica_reads (/dashboard, /routine-dashboard,
+# /api/analytics) run every query on it, the etag lookup of @conditional included. everything else stays on the
+# primary: logging in, every write, the pages the writes redirect to and the background jobs.
+#
+# a replica runs a little behind the primary. so a user who has just saved a workout doesn't get a dashboard
+# without it, every write (note_data_change) keeps that user's cookie session on the primary for
+# REPLICA_STICKY_SECONDS, and the replica views read the primary until that runs out, so the window should be
+# longer than the replica usually lags. what a view computes from a replica that hasn't caught up yet is cached
+# under the data_version it read there (see cache.py), the page is recomputed once the replica has the write.
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, session as cookie_session
+
+from models import REPLICA_BIND, db
+
+
+# the cookie session key holding the time (unix seconds) the user reads the primary until
+PRIMARY_UNTIL = 'primary_until'
+
+
+def init_replica(app):
+    # before db.init_app(), the bind is read from the config when the engine is first built
+    url = app.config['REPLICA_DATABASE_URL']
+    if url:
+        app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}), REPLICA_BIND: url}
+
+
+def stick_to_primary():
+    # called for every write made in a request
+    if not has_request_context() or not current_app.config['REPLICA_DATABASE_URL']:
+        return
+    cookie_session[PRIMARY_UNTIL] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+def reads_replica():
+    if not current_app.config['REPLICA_DATABASE_URL']:
+        return False
+    return cookie_session.get(PRIMARY_UNTIL, 0) <= time.time()
+
+
+def replica_reads(view):
+    # goes under @login_required (the user is loaded from the primary) and above @conditional
+    @wraps(view)
+    def replica_view(*args, **kwargs):
+        if not reads_replica():
+            return view(*args, **kwargs)
+        db.session.info[REPLICA_BIND] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop(REPLICA_BIND, None)
+    return replica_view
@@ -0,0 +1,31 @@
+# one-off rebuild of the personal_records table from the exercises log, for every user or just one
+#   python scripts/backfill_personal_records.py [--user-id 3]
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrate import database_url  # noqa: E402
+from records import rebuild_all_personal_records, rebuild_personal_records  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild personal_records from the exercises log')
+    parser.add_argument('--database-url')
+    parser.add_argument('--user-id', type=int, help='only rebuild this user')
+    args = parser.parse_args()
+
+    engine = create_engine(database_url(args.database_url))
+    with engine.begin() as connection:
+        if args.user_id is None:
+            rebuild_all_personal_records(connection)
+        else:
+            rebuild_personal_records(connection, args.user_id)
+        count = connection.execute(text('SELECT count(*) FROM personal_records')).scalar()
+    print(f'personal_records rebuilt, {count} records in the table')
+
+
+if __name__ == '__main__':
+    main()
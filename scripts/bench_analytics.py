@@ -0,0 +1,79 @@
+# how long analytics.py takes over a power user's history, against a python loop over the orm objects. one
+# synthetic user with --sessions sessions of 5 exercises each (12000 -> 60k logged sets), then for each formula:
+#   orm loop -> Exercises.query ... .all() and a dict of sessions per exercise built set by set
+#   numpy    -> analytics.exercise_summaries, i.e. one USER_SETS query and the grouped array operations
+#
+#   python scripts/bench_analytics.py --database-url postgresql://.../scratch [--sessions 12000 --repeat 5]
+# needs an empty scratch database, rows are added to it
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import FORMULAS, exercise_summaries, load_sets, session_figures  # noqa: E402
+from models import db, Exercises, User  # noqa: E402
+from server import create_app  # noqa: E402
+from synthetic_data import generate, user_email  # noqa: E402
+from bench_routes import percentile  # noqa: E402
+
+
+def orm_loop(user_id, formula):
+    # what the summaries would cost written the obvious way
+    sessions = {}
+    rows = Exercises.query.filter(Exercises.user_id == user_id, Exercises.date.isnot(None),
+                                  Exercises.weight.isnot(None)).all()
+    for row in rows:
+        reps = row.reps or 1
+        if reps <= 1:
+            estimate = row.weight
+        elif formula == 'epley':
+            estimate = row.weight * (1 + reps / 30)
+        else:
+            estimate = row.weight * 36 / (37 - reps) if reps < 37 else None
+        best, tonnage = sessions.setdefault(row.exercise, {}).get(row.date, (None, 0))
+        if estimate is not None and (best is None or estimate > best):
+            best = estimate
+        sessions[row.exercise][row.date] = (best, tonnage + (row.sets or 1) * reps * row.weight)
+    return {exercise: max(best for best, tonnage in days.values() if best is not None)
+            for exercise, days in sessions.items()}
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.expunge_all()
+    return timings
+
+
+def report(label, timings):
+    print(f'{label:28} p50 {percentile(timings, 50):8.1f} ms   p95 {percentile(timings, 95):8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the training analytics over one long history')
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--sessions', type=int, default=12000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'TESTING': True, 'ANALYTICS_CACHE': 'null'})
+    generate(app, 1, 4, args.sessions)
+    with app.app_context():
+        user_id = User.query.filter_by(email=user_email(0)).first().id
+        sets = load_sets(db.session, user_id)
+        print(f'{len(sets["weight"])} logged sets over {len(sets["names"])} exercises\n')
+        report('load_sets', timed(lambda: load_sets(db.session, user_id), args.repeat))
+        report('session_figures (no query)', timed(lambda: session_figures(sets), args.repeat))
+        for formula in FORMULAS:
+            report(f'orm loop, {formula}', timed(lambda: orm_loop(user_id, formula), args.repeat))
+            report(f'numpy, {formula}', timed(lambda: exercise_summaries(db.session, user_id, formula),
+                                              args.repeat))
+
+
+if __name__ == '__main__':
+    main()
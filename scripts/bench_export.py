@@ -0,0 +1,87 @@
+# checks that /api/export streams: fills a database with a million synthetic sets for one user, downloads the
+# export through the flask test client without buffering, and fails if python's peak memory (tracemalloc) during
+# the download goes over the ceiling. also prints the throughput.
+#
+#   python scripts/bench_export.py [--rows 1000000] [--format csv|ndjson] [--gzip] [--ceiling-mb 50]
+# uses a throwaway sqlite file unless --database-url is given (the rows are added to that database, use a scratch one)
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk import insert_rows  # noqa: E402
+from models import db, Exercises, User  # noqa: E402
+from names import encode_exercise_rows  # noqa: E402
+from server import create_app  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+EXERCISES = ['Squat', 'Bench', 'Deadlift', 'Overhead Press', 'Row', 'Pull Up', 'Dip', 'Lunge']
+
+
+def fill(app, rows, email):
+    with app.app_context():
+        db.create_all()
+        user = User(email=email, first_name='Export', last_name='Bench',
+                    password=generate_password_hash('bench', method='pbkdf2:sha256', salt_length=8))
+        db.session.add(user)
+        db.session.commit()
+        rnd = random.Random(0)
+        start = date(2000, 1, 1)
+        batch = []
+        for i in range(rows):
+            batch.append({'user_id': user.id, 'date': start + timedelta(days=i // len(EXERCISES) // 4),
+                          'workout': 'Full Body', 'exercise': EXERCISES[i % len(EXERCISES)], 'sets': 3,
+                          'reps': rnd.randint(1, 12), 'weight': rnd.randint(45, 405)})
+            if len(batch) == 50000:
+                insert_rows(db.session, Exercises.__table__, encode_exercise_rows(db.session, user.id, batch))
+                db.session.commit()
+                batch = []
+        insert_rows(db.session, Exercises.__table__, encode_exercise_rows(db.session, user.id, batch))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the export streams under a memory ceiling')
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', default='csv', choices=['csv', 'ndjson'])
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--ceiling-mb', type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.database_url or f'sqlite:///{os.path.join(directory, "export_bench.db")}'
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SQLALCHEMY_ENGINE_OPTIONS': {}, 'TESTING': True})
+        email = f'export-bench-{time.time()}@example.com'
+        print(f'inserting {args.rows} rows...')
+        fill(app, args.rows, email)
+
+        client = app.test_client()
+        client.post('/login', data={'email': email, 'password': 'bench'})
+        query = f'/api/export?format={args.format}' + ('&gzip=1' if args.gzip else '')
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.get(query, buffered=False)
+        downloaded = 0
+        for chunk in response.response:
+            downloaded += len(chunk)
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        response.close()
+
+    peak_mb = peak / 1024 / 1024
+    print(f'exported {args.rows} rows ({downloaded / 1024 / 1024:.1f} MB) in {elapsed:.1f} s, '
+          f'{args.rows / elapsed:,.0f} rows/s, peak python memory {peak_mb:.1f} MB')
+    if peak_mb > args.ceiling_mb:
+        raise SystemExit(f'peak memory {peak_mb:.1f} MB is over the {args.ceiling_mb} MB ceiling')
+
+
+if __name__ == '__main__':
+    main()
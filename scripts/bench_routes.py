@@ -0,0 +1,226 @@
+# route benchmark: fills an empty database with synthetic_data.py, then drives the main pages and write flows
+# through the flask test client as the synthetic users and records per-route latency (p50/p95/mean) and the
+# number of sql statements each request ran. the results go to a json file; pass an earlier one as --baseline to
+# print the change per route and exit non-zero if any p95 or query count got worse by more than --tolerance.
+#
+#   python scripts/bench_routes.py [--users 10 --routines 4 --sessions 200 --requests 50] [--output bench.json]
+#                                  [--database-url postgresql://.../scratch] [--cache null|memory] [--baseline old.json]
+# uses a throwaway sqlite file unless --database-url is given (use an empty scratch database, rows are added to it).
+# the analytics cache is off by default so the numbers are the cost of the queries, not of a cache hit
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import event  # noqa: E402
+
+from activity import record_completed_routines  # noqa: E402
+from bulk import insert_rows  # noqa: E402
+from definitions import add_routine  # noqa: E402
+from models import db, CompletedRoutines, Exercises, User  # noqa: E402
+from names import encode_exercise_rows  # noqa: E402
+from server import create_app  # noqa: E402
+from synthetic_data import PASSWORD, generate, routine_plan, user_email  # noqa: E402
+
+SCRATCH_ROUTINE = 'Bench Scratch'
+
+
+class QueryCounter:
+    # counts the queries of the thread that created it, the background jobs (jobs.py) run on their own threads
+    def __init__(self, engine):
+        self.count = 0
+        self.thread = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self.increment)
+
+    def increment(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+    def remove(self, engine):
+        event.remove(engine, 'before_cursor_execute', self.increment)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def login(app, n):
+    client = app.test_client()
+    response = client.post('/login', data={'email': user_email(n), 'password': PASSWORD})
+    assert response.status_code == 302, f'could not log in as {user_email(n)}'
+    return client
+
+
+def add_scratch_routine(app, n):
+    # a small routine for the delete flow to remove, so the synthetic routines survive every iteration
+    with app.app_context():
+        user_id = User.query.filter_by(email=user_email(n)).first().id
+        add_routine(db.session, user_id, SCRATCH_ROUTINE, ['Plank'])
+        rows = []
+        for s in range(10):
+            rows.append({'user_id': user_id, 'date': date(2020, 1, 1) + timedelta(days=s), 'workout': SCRATCH_ROUTINE,
+                         'exercise': 'Plank', 'sets': 3, 'reps': 1, 'weight': 10 + s})
+        rows = encode_exercise_rows(db.session, user_id, rows)
+        insert_rows(db.session, Exercises.__table__, rows)
+        completed_rows = [{'user_id': user_id, 'date': row['date'], 'workout_name_id': row['workout_name_id']}
+                          for row in rows]
+        insert_rows(db.session, CompletedRoutines.__table__, completed_rows)
+        record_completed_routines(db.session, completed_rows)
+        db.session.commit()
+
+
+def scenarios(plans):
+    # name -> function(client, n, i) returning (method, url, form) for the i-th request as user n.
+    # a `setup` entry runs untimed before each request
+    def first_routine(n):
+        return list(plans[n])[0]
+
+    def log_workout(client, n, i):
+        routine = first_routine(n)
+        form = {'workout_date': (date(2030, 1, 1) + timedelta(days=i)).isoformat(),
+                'Number_of_Exercises': str(len(plans[n][routine]))}
+        for position, exercise in enumerate(plans[n][routine], start=1):
+            form.update({f'Exercise{position}': exercise, f'Workout{position}': routine,
+                         f'Sets{position}': '3', f'Reps{position}': '5', f'Weight{position}': str(100 + i)})
+        return 'POST', f'/?routine_name={routine}', form
+
+    return {
+        'dashboard': {'request': lambda client, n, i: ('GET', '/dashboard', None)},
+        'routine_dashboard': {'request': lambda client, n, i: (
+            'GET', f'/routine-dashboard?routine={first_routine(n)}', None)},
+        'routine_dashboard_exercise': {'request': lambda client, n, i: (
+            'GET', f'/routine-dashboard?routine={first_routine(n)}'
+                   f'&specific_exercise={plans[n][first_routine(n)][0]}', None)},
+        'choose_a_workout': {'request': lambda client, n, i: ('GET', '/choose-a-workout', None)},
+        'log_workout': {'request': log_workout},
+        'delete_routine': {'setup': add_scratch_routine, 'request': lambda client, n, i: (
+            'POST', '/enter-your-stats', {'button': 'Delete Routine', 'Workout_ListBox': SCRATCH_ROUTINE})},
+        'save_routine': {'request': lambda client, n, i: (
+            'POST', '/save', {'old_routine_name': first_routine(n), 'new_routine_name': first_routine(n)})},
+    }
+
+
+def run(app, clients, plans, requests, only=None, verbose=True):
+    engine = db.get_engine(app)
+    counter = QueryCounter(engine)
+    results = {}
+    for name, scenario in scenarios(plans).items():
+        if only and name not in only:
+            continue
+        timings, queries = [], []
+        for i in range(requests):
+            n = i % len(clients)
+            if 'setup' in scenario:
+                scenario['setup'](app, n)
+            method, url, form = scenario['request'](clients[n], n, i)
+            counter.count = 0
+            started = time.perf_counter()
+            response = clients[n].open(url, method=method, data=form)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            # the jobs the request queued run before the next one is timed
+            app.extensions['jobs'].wait()
+            assert response.status_code < 400, f'{name}: {method} {url} returned {response.status_code}'
+        results[name] = {
+            'requests': requests,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries_per_request': round(statistics.fmean(queries), 2),
+            'max_queries': max(queries),
+        }
+        if verbose:
+            print(f'{name:28} p50 {results[name]["p50_ms"]:9.2f} ms   p95 {results[name]["p95_ms"]:9.2f} ms   '
+                  f'{results[name]["queries_per_request"]:6.1f} queries')
+    counter.remove(engine)
+    return results
+
+
+def compare(results, meta, baseline, tolerance):
+    # returns the routes whose p95 or query count got worse than the baseline by more than tolerance (a fraction)
+    regressions = []
+    for setting in ('users', 'routines', 'sessions', 'seed', 'cache', 'dialect'):
+        if baseline['meta'].get(setting) != meta[setting]:
+            print(f'note: the baseline ran with {setting}={baseline["meta"].get(setting)}, this run with {meta[setting]}')
+    print(f'\nagainst {baseline["meta"].get("revision") or "baseline"}:')
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        p95_change = current['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0
+        query_change = current['queries_per_request'] - previous['queries_per_request']
+        print(f'{name:28} p95 {p95_change:+7.1%}   queries {query_change:+6.1f}')
+        if p95_change > tolerance or query_change > previous['queries_per_request'] * tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the main routes against synthetic data')
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--routines', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--cache', default='null', choices=['null', 'memory'])
+    parser.add_argument('--only', help='comma separated routes to run')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.database_url or f'sqlite:///{os.path.join(directory, "route_bench.db")}'
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True, 'ANALYTICS_CACHE': args.cache})
+        print(f'generating {args.users} users x {args.routines} routines x {args.sessions} sessions...')
+        started = time.perf_counter()
+        meta = generate(app, args.users, args.routines, args.sessions, seed=args.seed)
+        print(f'  done in {time.perf_counter() - started:.1f}s')
+
+        # the same plans generate() used, so the requests name routines and exercises the users really have
+        plans = [routine_plan(random.Random(f'{args.seed}-{n}'), args.routines) for n in range(args.users)]
+        clients = [login(app, n) for n in range(args.users)]
+        # one untimed pass per route so connection setup and template compilation aren't in the numbers
+        only = args.only.split(',') if args.only else None
+        run(app, clients, plans, 1, only=only, verbose=False)
+        results = run(app, clients, plans, args.requests, only=only)
+        with app.app_context():
+            dialect = db.engine.dialect.name
+
+    meta.update({'requests': args.requests, 'cache': args.cache, 'dialect': dialect, 'revision': revision(),
+                 'python': platform.python_version(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')})
+    with open(args.output, 'w') as output:
+        json.dump({'meta': meta, 'results': results}, output, indent=2)
+    print(f'\nresults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, meta, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f'regressed: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
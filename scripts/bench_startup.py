@@ -0,0 +1,106 @@
+# measures how long the app takes to start, the cost every gunicorn worker pays when it boots
+#   1. import: `python -X importtime` of `import server; server.create_app()`, the total and the slowest modules
+#   2. fork to first response: boots gunicorn with one worker the way the Procfile does, records the moment the
+#      worker is forked (post_fork hook) and polls until the first 200 comes back
+#
+#   python scripts/bench_startup.py [--runs 5] [--path /login] [--top 15]
+# the app uses DATABASE_URL like it does in production, point it at the database you want to measure against
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GUNICORN_CONFIG = '''
+import time
+
+def post_fork(server, worker):
+    with open({marker!r}, 'w') as marker:
+        marker.write(repr(time.time()))
+'''
+
+
+def import_times(top):
+    # importtime lines look like 'import time:      self [us] |  cumulative | imported package'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import server; server.create_app()'],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+    server_cumulative = next(cumulative for cumulative, self_us, name in modules if name.strip() == 'server')
+    print(f'import server: {server_cumulative / 1000:.1f} ms cumulative')
+    print(f'slowest {top} imports (cumulative ms, self ms):')
+    for cumulative, self_us, name in sorted(modules, reverse=True)[:top]:
+        print(f'  {cumulative / 1000:8.1f} {self_us / 1000:8.1f} {name}')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fork_to_first_response(path, timeout=60):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        marker = os.path.join(directory, 'forked_at')
+        config = os.path.join(directory, 'gunicorn_bench.py')
+        with open(config, 'w') as config_file:
+            config_file.write(GUNICORN_CONFIG.format(marker=marker))
+
+        started_at = time.time()
+        process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', config, '-w', '1',
+                                    '-b', f'127.0.0.1:{port}', 'server:create_app()'],
+                                   cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if time.time() - started_at > timeout or process.poll() is not None:
+                    raise SystemExit('gunicorn did not answer, check that the app starts with `flask --app server run`')
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}') as response:
+                        if response.status == 200:
+                            break
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.005)
+            answered_at = time.time()
+            with open(marker) as marker_file:
+                forked_at = float(marker_file.read())
+        finally:
+            process.terminate()
+            process.wait()
+    return forked_at - started_at, answered_at - forked_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the app startup cost')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help='page requested as the first response')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    import_times(args.top)
+
+    boots, first_responses = [], []
+    for _ in range(args.runs):
+        boot, first_response = fork_to_first_response(args.path)
+        boots.append(boot)
+        first_responses.append(first_response)
+    print(f'gunicorn master start to worker fork: median {statistics.median(boots) * 1000:.1f} ms')
+    print(f'worker fork to first response ({args.path}): median {statistics.median(first_responses) * 1000:.1f} ms, '
+          f'max {max(first_responses) * 1000:.1f} ms over {args.runs} runs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# what bound parameters and prepared statements buy on repeated dashboard loads. runs the statements behind
+# /dashboard and /routine-dashboard for the synthetic users in three ways and prints the time per page load:
+#   literal  -> the values pasted into the sql text, as the old f-string queries did: every user and routine is
+#               a new statement for sqlalchemy's compiled cache and for the server's parser and planner
+#   bound    -> the queries.py statements with bound parameters (the default)
+#   prepared -> the same statements with PREPARED_STATEMENTS on, PREPAREd once per connection and EXECUTEd
+# then loads both pages through the test client with PREPARED_STATEMENTS off and on.
+#
+#   python scripts/bench_statements.py --database-url postgresql://.../scratch [--users 10 --loads 200]
+# needs postgres (prepared statements are postgres only) and an empty scratch database, rows are added to it
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import db, User  # noqa: E402
+from names import WORKOUT_NAMES, name_id  # noqa: E402
+from queries import (DASHBOARD_FIGURES, LAST_ROUTINE_DATES, ROUTINE_SERIES, COMPLETED_ROUTINE_NAMES,  # noqa: E402
+                     fetch)
+from server import create_app  # noqa: E402
+from synthetic_data import PASSWORD, generate, routine_plan, user_email  # noqa: E402
+from bench_routes import percentile  # noqa: E402
+
+
+def page_loads(plans, user_ids, loads):
+    # the statements (and their parameters) of `loads` dashboard + routine dashboard visits, spread over the users.
+    # the routine names are resolved the way the views do, through the name cache
+    until = date.today()
+    since = until - timedelta(days=30)
+    for i in range(loads):
+        n = i % len(plans)
+        routine = list(plans[n])[i // len(plans) % len(plans[n])]
+        workout_name_id = name_id(db.session, WORKOUT_NAMES, user_ids[n], routine)
+        yield [
+            (DASHBOARD_FIGURES, {'user_id': user_ids[n], 'since': since, 'until': until}),
+            (LAST_ROUTINE_DATES, {'user_id': user_ids[n], 'workout_name_id': workout_name_id, 'limit': 8}),
+            (ROUTINE_SERIES, {'user_id': user_ids[n], 'workout_name_id': workout_name_id, 'limit': 8}),
+            (COMPLETED_ROUTINE_NAMES, {'user_id': user_ids[n]}),
+        ]
+
+
+def run_literal(statement, params):
+    # psycopg2 pastes the quoted values into the sql text, the way the f-strings did
+    connection = db.session.connection()
+    compiled = statement.clause.compile(dialect=connection.dialect)
+    cursor = connection.connection.cursor()
+    sql = cursor.mogrify(compiled.string, {**compiled.params, **params}).decode()
+    cursor.close()
+    return connection.exec_driver_sql(sql).all()
+
+
+def time_statements(app, plans, user_ids, loads, mode):
+    app.config['PREPARED_STATEMENTS'] = mode == 'prepared'
+    timings = []
+    with app.test_request_context():
+        for statements in page_loads(plans, user_ids, loads):
+            started = time.perf_counter()
+            for statement, params in statements:
+                if mode == 'literal':
+                    run_literal(statement, params)
+                else:
+                    fetch(db.session, statement, **params)
+            timings.append((time.perf_counter() - started) * 1000)
+        db.session.remove()
+    return timings
+
+
+def time_pages(app, plans, loads, prepared):
+    app.config['PREPARED_STATEMENTS'] = prepared
+    clients = []
+    for n in range(len(plans)):
+        client = app.test_client()
+        client.post('/login', data={'email': user_email(n), 'password': PASSWORD})
+        clients.append(client)
+    timings = []
+    for i in range(loads):
+        n = i % len(plans)
+        routine = list(plans[n])[i // len(plans) % len(plans[n])]
+        started = time.perf_counter()
+        assert clients[n].get('/dashboard').status_code == 200
+        assert clients[n].get('/routine-dashboard', query_string={'routine': routine}).status_code == 200
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    print(f'{label:24} p50 {percentile(timings, 50):8.2f} ms   p95 {percentile(timings, 95):8.2f} ms   '
+          f'total {sum(timings):9.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare literal, bound and prepared dashboard statements')
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--routines', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--loads', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'TESTING': True, 'ANALYTICS_CACHE': 'null'})
+    generate(app, args.users, args.routines, args.sessions)
+    plans = [routine_plan(random.Random(f'0-{n}'), args.routines) for n in range(args.users)]
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            sys.exit('prepared statements need postgres')
+        user_ids = [User.query.filter_by(email=user_email(n)).first().id for n in range(args.users)]
+
+    print(f'{args.loads} dashboard + routine dashboard loads, {args.users} users\n\nstatements only:')
+    for mode in ('literal', 'bound', 'prepared'):
+        time_statements(app, plans, user_ids, args.users * args.routines, mode)  # warm up
+        report(mode, time_statements(app, plans, user_ids, args.loads, mode))
+
+    print('\nthrough the views:')
+    for prepared in (False, True):
+        time_pages(app, plans, args.users, prepared)
+        report('prepared' if prepared else 'bound', time_pages(app, plans, args.loads, prepared))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# checks the read replica routing (replica.py) against two databases standing in for a primary and its replica.
+# "replication" is a copy of every table from the primary to the replica, done only when the script says so, so the
+# replica is as far behind as the script wants. it logs a workout through the test client and checks, counting the
+# statements each engine runs, that
+#   - /dashboard, /routine-dashboard and /api/analytics read the replica, other pages read the primary
+#   - the write goes to the primary only
+#   - right after the write the dashboard reads the primary and shows the workout, once the sticky window is over it
+#     reads the replica again (which doesn't have it until the next copy)
+#
+#   python scripts/check_replica_routing.py [--primary-url ... --replica-url ...] [--sticky-seconds 1]
+# uses two throwaway sqlite files unless the urls are given (both databases are emptied, use scratch ones)
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import event  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from activity import record_completed_routines  # noqa: E402
+from bulk import insert_rows  # noqa: E402
+from definitions import add_routine  # noqa: E402
+from models import db, CompletedRoutines, Exercises, User  # noqa: E402
+from names import WORKOUT_NAMES, encode_exercise_rows, name_id  # noqa: E402
+from pool import replica_engine  # noqa: E402
+from server import create_app  # noqa: E402
+
+EMAIL = 'replica-check@example.com'
+PASSWORD = 'replica'
+
+
+def fill(app):
+    with app.app_context():
+        for engine in (db.engine, replica_engine(app)):
+            db.metadata.drop_all(bind=engine)
+            db.metadata.create_all(bind=engine)
+        user = User(email=EMAIL, first_name='Replica', last_name='Check',
+                    password=generate_password_hash(PASSWORD, method='pbkdf2:sha256', salt_length=8))
+        db.session.add(user)
+        db.session.commit()
+        add_routine(db.session, user.id, 'Legs', ['Squat'])
+        session_date = date.today() - timedelta(days=1)
+        rows = [{'user_id': user.id, 'date': session_date, 'workout': 'Legs', 'exercise': 'Squat', 'sets': 3,
+                 'reps': 5, 'weight': 225.0}]
+        insert_rows(db.session, Exercises.__table__, encode_exercise_rows(db.session, user.id, rows))
+        completed = [{'user_id': user.id, 'date': session_date,
+                      'workout_name_id': name_id(db.session, WORKOUT_NAMES, user.id, 'Legs', create=True)}]
+        insert_rows(db.session, CompletedRoutines.__table__, completed)
+        record_completed_routines(db.session, completed)
+        db.session.commit()
+
+
+def replicate(app):
+    # the replica catches up: every table copied over from the primary
+    with app.app_context():
+        with db.engine.connect() as primary, replica_engine(app).begin() as replica:
+            for table in reversed(db.metadata.sorted_tables):
+                replica.execute(table.delete())
+            for table in db.metadata.sorted_tables:
+                rows = [dict(row._mapping) for row in primary.execute(table.select())]
+                if rows:
+                    replica.execute(table.insert(), rows)
+
+
+class StatementCounter:
+    def __init__(self, app):
+        self.counts = Counter()
+        with app.app_context():
+            for name, engine in (('primary', db.engine), ('replica', replica_engine(app))):
+                event.listen(engine, 'before_cursor_execute', self.listener(name))
+
+    def listener(self, name):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.counts[name] += 1
+            if not statement.lstrip().upper().startswith('SELECT') and not statement.lstrip().upper().startswith(
+                    'WITH'):
+                self.counts[f'{name} writes'] += 1
+        return count
+
+    def during(self, request):
+        before = self.counts.copy()
+        response = request()
+        after = self.counts.copy()
+        after.subtract(before)
+        return response, {name: count for name, count in after.items() if count}
+
+
+def check(label, ok, detail=''):
+    print(f'{"ok  " if ok else "FAIL"} {label}' + (f'  {detail}' if detail else ''))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the read replica routing against two databases')
+    parser.add_argument('--primary-url')
+    parser.add_argument('--replica-url')
+    parser.add_argument('--sticky-seconds', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        primary_url = args.primary_url or f'sqlite:///{os.path.join(directory, "primary.db")}'
+        replica_url = args.replica_url or f'sqlite:///{os.path.join(directory, "replica.db")}'
+        app = create_app({'SQLALCHEMY_DATABASE_URI': primary_url, 'SQLALCHEMY_ENGINE_OPTIONS': {},
+                          'REPLICA_DATABASE_URL': replica_url, 'REPLICA_STICKY_SECONDS': args.sticky_seconds,
+                          'ANALYTICS_CACHE': 'null', 'JOBS_WORKERS': 0, 'TESTING': True})
+        fill(app)
+        replicate(app)
+        counter = StatementCounter(app)
+        client = app.test_client()
+        client.post('/login', data={'email': EMAIL, 'password': PASSWORD})
+
+        results = []
+        for path in ('/dashboard', '/routine-dashboard?routine=Legs', '/api/analytics'):
+            response, counts = counter.during(lambda: client.get(path))
+            results.append(check(f'{path} reads the replica', response.status_code == 200
+                                 and counts.get('replica', 0) > 0 and 'primary' not in counts, counts))
+        response, counts = counter.during(lambda: client.get('/choose-a-workout'))
+        results.append(check('/choose-a-workout reads the primary',
+                             response.status_code == 200 and 'replica' not in counts, counts))
+
+        form = {'workout_date': date.today().isoformat(), 'Number_of_Exercises': '1', 'Exercise1': 'Curl',
+                'Workout1': 'Arms', 'Sets1': '3', 'Reps1': '10', 'Weight1': '40'}
+        response, counts = counter.during(lambda: client.post('/?routine_name=Arms', data=form))
+        results.append(check('the workout is written to the primary only',
+                             response.status_code == 302 and counts.get('primary writes', 0) > 0
+                             and 'replica' not in counts, counts))
+
+        response, counts = counter.during(lambda: client.get('/dashboard'))
+        results.append(check('right after the write the dashboard reads the primary and shows it',
+                             b'Arms' in response.data and 'replica' not in counts, counts))
+
+        time.sleep(args.sticky_seconds + 0.1)
+        response, counts = counter.during(lambda: client.get('/dashboard'))
+        results.append(check('after the sticky window it reads the (behind) replica again',
+                             b'Arms' not in response.data and 'primary' not in counts, counts))
+
+        replicate(app)
+        response, counts = counter.during(lambda: client.get('/dashboard'))
+        results.append(check('once the replica catches up the dashboard shows the workout',
+                             b'Arms' in response.data and 'primary' not in counts, counts))
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# checks that deleting and editing a routine don't grow with the exercises table: fills a database with synthetic
+# data (synthetic_data.py), runs the Delete Routine and Edit Routine -> /save flows through the flask test client,
+# then does the same on a database with --scale times as many logged sessions. both flows have to run the same
+# number of sql statements at either size and load no rows into the orm session, or the script exits non-zero.
+#
+#   python scripts/check_routine_writes_scale.py [--users 3 --routines 3 --sessions 100 --scale 10]
+# uses throwaway sqlite files unless --database-url is given (the database is emptied twice, use a scratch one)
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from models import db  # noqa: E402
+from server import create_app  # noqa: E402
+from synthetic_data import PASSWORD, generate, routine_plan, user_email  # noqa: E402
+
+
+class Counter:
+    # statements run on the engine and rows loaded into any orm session, background jobs included (they run
+    # inline with JOBS_WORKERS=0)
+    def __init__(self, engine):
+        self.statements = 0
+        self.loaded = 0
+        event.listen(engine, 'before_cursor_execute', self.count_statement)
+        event.listen(Session, 'loaded_as_persistent', self.count_load)
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def count_load(self, session, instance):
+        self.loaded += 1
+
+    def during(self, flow):
+        statements, loaded = self.statements, self.loaded
+        flow()
+        return self.statements - statements, self.loaded - loaded
+
+
+def measure(url, users, routines, sessions, seed):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True, 'JOBS_WORKERS': 0,
+                      'ANALYTICS_CACHE': 'null'})
+    with app.app_context():
+        db.drop_all()
+    generate(app, users, routines, sessions, seed=seed)
+    plan = routine_plan(random.Random(f'{seed}-0'), routines)
+    deleted, edited = list(plan)[:2]
+
+    client = app.test_client()
+    response = client.post('/login', data={'email': user_email(0), 'password': PASSWORD})
+    assert response.status_code == 302, f'could not log in as {user_email(0)}'
+    with app.app_context():
+        counter = Counter(db.engine)
+        rows = db.session.execute(db.text('SELECT count(*) FROM exercises')).scalar()
+
+    def delete_flow():
+        response = client.post('/enter-your-stats', data={'button': 'Delete Routine', 'Workout_ListBox': deleted})
+        assert response.status_code == 302, response.status_code
+
+    def edit_flow():
+        client.post('/enter-your-stats', data={'button': 'Edit Routine', 'Workout_ListBox': edited})
+        client.get('/delete-from-routine', query_string={'exercise_name': plan[edited][0], 'routine_name': edited})
+        response = client.post('/save', data={'old_routine_name': edited, 'new_routine_name': f'{edited} (edited)'})
+        assert response.status_code == 302, response.status_code
+
+    return rows, {'delete routine': counter.during(delete_flow), 'edit routine': counter.during(edit_flow)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that routine deletes and edits do not grow with the table')
+    parser.add_argument('--database-url')
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--routines', type=int, default=3)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--scale', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n, sessions in enumerate([args.sessions, args.sessions * args.scale]):
+            url = args.database_url or f'sqlite:///{os.path.join(directory, f"routine_writes_{n}.db")}'
+            rows, flows = measure(url, args.users, args.routines, sessions, args.seed)
+            print(f'{rows} exercises rows')
+            for flow, (statements, loaded) in flows.items():
+                print(f'  {flow:<16} {statements:>3} statements  {loaded:>3} orm rows loaded')
+            results.append(flows)
+
+    failed = False
+    small, large = results
+    for flow in small:
+        if small[flow][0] != large[flow][0]:
+            print(f'FAIL {flow}: {small[flow][0]} statements became {large[flow][0]} on the larger table')
+            failed = True
+        if small[flow][1] or large[flow][1]:
+            print(f'FAIL {flow}: loaded rows into the orm session')
+            failed = True
+    if failed:
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
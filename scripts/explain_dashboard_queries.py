@@ -0,0 +1,102 @@
+# prints the postgres query plans for the statements /dashboard and /routine-dashboard run (the ones in queries.py
+# and the personal records lookup in records.py, compiled the way the app sends them), first as they'd run without
+# the hot path indexes (index scans switched off for the transaction, which leaves only sequential scans) and then
+# with the indexes from migrations/v0001_hot_path_indexes.py (on the name ids since v0008).
+# nothing is written, the transaction is rolled back at the end.
+#
+#   python scripts/explain_dashboard_queries.py --user-id 3 --routine "Leg Day" --exercise "Squat" [--analyze]
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config  # noqa: E402
+from migrate import database_url  # noqa: E402
+from queries import (COMPLETED_ROUTINE_NAMES, DASHBOARD_FIGURES, EXERCISE_SERIES, LAST_ROUTINE_DATES,  # noqa: E402
+                     LOGGED_ROUTINE_EXERCISES, ROUTINE_SERIES)
+from records import PERSONAL_RECORDS_SQL  # noqa: E402
+from server import CHART_POINTS  # noqa: E402
+
+
+DASHBOARD_QUERIES = {
+    'dashboard figures': DASHBOARD_FIGURES.clause,
+}
+
+ROUTINE_DASHBOARD_QUERIES = {
+    'last 8 routine dates': LAST_ROUTINE_DATES.clause,
+    'routine series': ROUTINE_SERIES.clause,
+    'exercise series': EXERCISE_SERIES.clause,
+    'routine exercises': LOGGED_ROUTINE_EXERCISES.clause,
+    'personal records': PERSONAL_RECORDS_SQL,
+    'completed routine names': COMPLETED_ROUTINE_NAMES.clause,
+}
+
+DISABLE_INDEXES = ['SET LOCAL enable_indexscan = off', 'SET LOCAL enable_bitmapscan = off',
+                   'SET LOCAL enable_indexonlyscan = off']
+
+
+def name_ids(connection, user_id, routine, exercise):
+    def lookup(table, name):
+        return connection.execute(text(f'SELECT id FROM {table} WHERE user_id = :user_id AND name = :name'),
+                                  {'user_id': user_id, 'name': name}).scalar()
+
+    workout_name_id = lookup('workout_names', routine)
+    # the routine's exercises, the personal records are looked up for all of them
+    exercise_name_ids = [row[0] for row in connection.execute(
+        text('SELECT DISTINCT exercise_name_id FROM exercises WHERE user_id = :user_id '
+             'AND workout_name_id = :workout_name_id'), {'user_id': user_id, 'workout_name_id': workout_name_id})]
+    return {'workout_name_id': workout_name_id, 'exercise_name_id': lookup('exercise_names', exercise),
+            'exercise_name_ids': exercise_name_ids}
+
+
+def explain(connection, title, queries, params, analyze):
+    prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    print(f'=== {title} ===')
+    for name, clause in queries.items():
+        print(f'--- {name}')
+        # only the parameters the statement has, with the IN lists expanded the way they are at run time
+        own_params = {key: value for key, value in params.items() if key in clause.compile().params}
+        compiled = clause.params(**own_params).compile(dialect=connection.dialect,
+                                                       compile_kwargs={'render_postcompile': True})
+        for line, in connection.exec_driver_sql(prefix + compiled.string, compiled.params):
+            print(f'    {line}')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the dashboard query plans before/after the hot path indexes')
+    parser.add_argument('--database-url')
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--routine', required=True)
+    parser.add_argument('--exercise', required=True)
+    parser.add_argument('--analyze', action='store_true', help='run EXPLAIN ANALYZE (executes the queries)')
+    args = parser.parse_args()
+
+    engine = create_engine(database_url(args.database_url))
+    if engine.dialect.name != 'postgresql':
+        raise SystemExit('the query plans are only meaningful against the postgres database')
+
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            today = date.today()
+            params = {'user_id': args.user_id, 'since': today - timedelta(days=Config.DASHBOARD_WINDOW),
+                      'until': today, 'limit': CHART_POINTS,
+                      **name_ids(connection, args.user_id, args.routine, args.exercise)}
+            for setting in DISABLE_INDEXES:
+                connection.execute(text(setting))
+            explain(connection, 'BEFORE: dashboard()', DASHBOARD_QUERIES, params, args.analyze)
+            explain(connection, 'BEFORE: routine_dashboard()', ROUTINE_DASHBOARD_QUERIES, params, args.analyze)
+            for setting in DISABLE_INDEXES:
+                connection.execute(text(setting.replace('off', 'on')))
+            explain(connection, 'AFTER: dashboard()', DASHBOARD_QUERIES, params, args.analyze)
+            explain(connection, 'AFTER: routine_dashboard()', ROUTINE_DASHBOARD_QUERIES, params, args.analyze)
+        finally:
+            transaction.rollback()
+
+
+if __name__ == '__main__':
+    main()
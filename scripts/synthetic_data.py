@@ -0,0 +1,98 @@
+# deterministic synthetic data for benchmarking: N users, each with M routines of a few exercises and K logged
+# sessions spread over those routines, written through the same batched insert path the app uses. the same
+# arguments always produce the same rows, so benchmark runs are comparable.
+#
+#   python scripts/synthetic_data.py --database-url sqlite:////tmp/bench.db --users 20 --routines 4 --sessions 200
+# every user logs in with bench-user-<n>@example.com / bench
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from activity import rebuild_daily_activity  # noqa: E402
+from bulk import insert_rows  # noqa: E402
+from definitions import add_routine  # noqa: E402
+from models import db, CompletedRoutines, Exercises, Routines, User  # noqa: E402
+from names import WORKOUT_NAMES, encode_exercise_rows, name_ids  # noqa: E402
+from records import rebuild_personal_records  # noqa: E402
+
+PASSWORD = 'bench'
+EXERCISE_NAMES = ['Squat', 'Bench Press', 'Deadlift', 'Overhead Press', 'Barbell Row', 'Pull Up', 'Dip', 'Lunge',
+                  'Leg Press', 'Calf Raise', 'Curl', "Farmer's Walk", 'Hip Thrust', 'Face Pull', 'Shrug', 'Plank']
+EXERCISES_PER_ROUTINE = 5
+
+
+def user_email(n):
+    return f'bench-user-{n}@example.com'
+
+
+def routine_plan(rnd, routines):
+    # {'Routine 1': ['Squat', ...], ...}
+    return {f'Routine {r + 1}': rnd.sample(EXERCISE_NAMES, EXERCISES_PER_ROUTINE) for r in range(routines)}
+
+
+def generate(app, users, routines, sessions, seed=0, start=date(2019, 1, 1), first_user=0):
+    # users are numbered from first_user, so more can be added to a database that already has some
+    password = generate_password_hash(PASSWORD, method='pbkdf2:sha256', salt_length=8)
+    with app.app_context():
+        db.create_all()
+        for n in range(first_user, first_user + users):
+            rnd = random.Random(f'{seed}-{n}')
+            user = User(email=user_email(n), password=password, first_name='Bench', last_name=str(n))
+            db.session.add(user)
+            db.session.flush()
+
+            plan = routine_plan(rnd, routines)
+            exercise_rows, completed_rows = [], []
+            for routine, exercises in plan.items():
+                # the routine definitions that submit_new_routine() writes
+                add_routine(db.session, user.id, routine, exercises)
+            base_weights = {exercise: rnd.randint(45, 225) for exercise in EXERCISE_NAMES}
+            for s in range(sessions):
+                routine = list(plan)[s % routines]
+                session_date = start + timedelta(days=s * 2)
+                completed_rows.append({'user_id': user.id, 'date': session_date, 'workout': routine})
+                for exercise in plan[routine]:
+                    # a slow upward trend with noise, and the odd set logged without a weight
+                    weight = None if rnd.random() < 0.05 else \
+                        round(base_weights[exercise] + s * 0.25 + rnd.uniform(-10, 10), 1)
+                    exercise_rows.append({'user_id': user.id, 'date': session_date, 'workout': routine,
+                                          'exercise': exercise, 'sets': rnd.randint(3, 5) if weight else None,
+                                          'reps': rnd.randint(3, 12) if weight else None, 'weight': weight})
+            insert_rows(db.session, Exercises.__table__, encode_exercise_rows(db.session, user.id, exercise_rows))
+            workout_ids = name_ids(db.session, WORKOUT_NAMES, user.id, plan, create=True)
+            for row in completed_rows:
+                row['workout_name_id'] = workout_ids[row.pop('workout')]
+            insert_rows(db.session, CompletedRoutines.__table__, completed_rows)
+            # the edit-routine staging rows, as left behind by the last "Edit Routine" click
+            first_routine = list(plan)[0]
+            insert_rows(db.session, Routines.__table__, [{'user_id': user.id, 'workout': exercise,
+                                                          'routine_name': first_routine}
+                                                         for exercise in plan[first_routine]])
+            rebuild_personal_records(db.session, user.id)
+            rebuild_daily_activity(db.session, user.id)
+            db.session.commit()
+    return {'users': users, 'routines': routines, 'sessions': sessions, 'seed': seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill a database with deterministic synthetic training data')
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--routines', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from server import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    generate(app, args.users, args.routines, args.sessions, seed=args.seed)
+    print(f'{args.users} users x {args.routines} routines x {args.sessions} sessions written')
+
+
+if __name__ == '__main__':
+    main()